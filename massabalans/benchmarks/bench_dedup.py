@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+# python benchmarks/bench_dedup.py [millions of lines...]
+# Time of collapse_duplicates against the three passes the scripts made before, on synthetic sales exports
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, '..', 'tests'), os.path.join(BENCH_DIR, '..', 'oud')]
+
+from arrow_staging import SALES_LINE_KEYS
+from dedup import collapse_duplicates
+from synthetic_sales import LEGACY_DUPLICATE_KEYS, legacy_collapse, make_sales_lines
+
+def best_of(function, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run(rows: int) -> None:
+    df = make_sales_lines(rows)
+    categorical = df.astype({key: 'category' for key in ['SKU', 'Omschrijving', 'Batch', 'Orderstatus']})
+    legacy = best_of(lambda: legacy_collapse(df, LEGACY_DUPLICATE_KEYS))
+    new = best_of(lambda: collapse_duplicates(df, LEGACY_DUPLICATE_KEYS))
+    new_categorical = best_of(lambda: collapse_duplicates(categorical, LEGACY_DUPLICATE_KEYS))
+    merge_key = best_of(lambda: collapse_duplicates(df, SALES_LINE_KEYS))
+    print(f"{rows:,} regels ({len(collapse_duplicates(df, LEGACY_DUPLICATE_KEYS)):,} na samenvoegen): "
+          f"oud {legacy:.2f}s, nieuw {new:.2f}s, nieuw met categorieën {new_categorical:.2f}s, "
+          f"op de MERGE sleutel {merge_key:.2f}s")
+
+if __name__ == "__main__":
+    for millions in [float(arg) for arg in sys.argv[1:]] or [1, 3]:
+        run(int(millions * 1_000_000))
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+
+# python benchmarks/bench_mass_balance.py [batches...]
+# Time of normalise and reconcile over the five sources of the mass balance, on synthetic batches
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, '..'), os.path.join(BENCH_DIR, '..', 'oud')]
+
+import numpy as np
+import pandas as pd
+from mass_balance import normalise, reconcile
+from product_dimension import get_product_dimension
+
+def make_source(rng: np.random.Generator, batches: int, rows: int, skus: np.ndarray) -> pd.DataFrame:
+    # Lines of a Monta report or stock snapshot: a product and batch number per line, one batch per product
+    # Batch numbers come in as floats, like from a column with empty cells
+    batch = rng.integers(0, batches, rows)
+    return pd.DataFrame({'SKU': skus[batch % len(skus)], 'Batch': (batch + 100000).astype(float), 'Aantal': rng.integers(1, 50, rows)})
+
+def run(batches: int) -> None:
+    rng = np.random.default_rng(0)
+    skus = np.array(get_product_dimension().products['name'].tolist() + [f'87190000{index:05d}' for index in range(20)])
+    raw = {
+        'Begin': make_source(rng, batches, batches, skus),
+        'Inbound': make_source(rng, batches, batches // 2, skus),
+        'Verkoop': make_source(rng, batches, batches * 3, skus),
+        'Retour': make_source(rng, batches, batches // 20, skus),
+        'Eind': make_source(rng, batches, batches, skus),
+    }
+    lines = sum(len(df) for df in raw.values())
+
+    start = time.perf_counter()
+    sources = {name: normalise(df, 'SKU', 'Batch', 'Aantal') for name, df in raw.items()}
+    normalised = time.perf_counter() - start
+
+    start = time.perf_counter()
+    balance = reconcile(sources)
+    reconciled = time.perf_counter() - start
+
+    print(f"{batches:,} batches ({lines:,} regels, {len(balance):,} in de balans): "
+          f"normaliseren {normalised:.2f}s, reconciliatie {reconciled:.2f}s")
+
+if __name__ == "__main__":
+    for batches in [int(arg) for arg in sys.argv[1:]] or [300_000]:
+        run(batches)
@@ -0,0 +1,33 @@
+import os
+import statistics
+import sys
+import time
+import requests
+from requests.auth import HTTPBasicAuth
+
+# python benchmarks/bench_monta_client.py [requests]
+# Latency per request of a bare requests.get (new connection every time) against the pooled MontaClient
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, '..', 'tests'), os.path.join(BENCH_DIR, '..', 'oud')]
+
+from monta_client import MontaClient
+from stub_monta import StubMonta, make_order
+
+def measure(get, count: int) -> list[float]:
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        get('order/1').content
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with StubMonta([make_order(1, '2024-04-01T10:00:00')]) as stub:
+        auth = ('user', 'password')
+        bare = measure(lambda endpoint: requests.get(stub.url + endpoint, auth=HTTPBasicAuth(*auth)), count)
+        with MontaClient(stub.url, *auth, rate_limit=100000) as client:
+            pooled = measure(client.get, count)
+
+    for name, latencies in (('zonder pool', bare), ('MontaClient', pooled)):
+        print(f"{name}: mediaan {statistics.median(latencies):.2f} ms, p95 {statistics.quantiles(latencies, n=20)[-1]:.2f} ms")
@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+
+# python benchmarks/bench_order_enrichment.py [orders] [latency_ms]
+# Serial enrichment (the old create_order_dataframe loop) against fetch_order_details on a local stub
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, '..', 'tests'), os.path.join(BENCH_DIR, '..', 'oud')]
+
+import retrieve_order_info_monta as orders
+from monta_client import MontaClient
+from stub_monta import StubMonta, make_order
+
+if __name__ == "__main__":
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    fixture_orders = [make_order(order_id, '2024-04-01T10:00:00') for order_id in range(order_count)]
+    order_ids = [order['WebshopOrderId'] for order in fixture_orders]
+
+    with StubMonta(fixture_orders, latency=latency) as stub:
+        orders.monta_client = MontaClient(stub.url, 'user', 'password', rate_limit=100000)
+
+        start = time.perf_counter()
+        for order_id in order_ids:
+            orders.retrieve_order_data(order_id)
+            orders.retrieve_order_batches(order_id)
+        serial = time.perf_counter() - start
+        print(f"serieel: {serial:.2f}s")
+
+        for max_workers in (4, 16, 32):
+            start = time.perf_counter()
+            list(orders.fetch_order_details(order_ids, max_workers))
+            seconds = time.perf_counter() - start
+            print(f"fetch_order_details max_workers={max_workers}: {seconds:.2f}s ({serial / seconds:.1f}x)")
@@ -0,0 +1,36 @@
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+# python benchmarks/bench_rate_limit.py [server_rate] [requests] [workers]
+# How close the shared token bucket gets to the throughput the server allows, and how often it is throttled
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, '..', 'tests'), os.path.join(BENCH_DIR, '..', 'oud')]
+
+from monta_client import MontaClient
+from stub_monta import StubMonta, make_order
+
+def run(server_rate: float, client_rate: float, count: int, workers: int) -> None:
+    with StubMonta([make_order(1, '2024-04-01T10:00:00')], rate_limit=server_rate) as stub:
+        with MontaClient(stub.url, 'user', 'password', rate_limit=client_rate, max_retries=20) as client:
+            start = time.perf_counter()
+            # The retry messages of the client are not part of the measurement
+            with redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as executor:
+                statuses = list(executor.map(lambda _: client.get('order/1').status_code, range(count)))
+            seconds = time.perf_counter() - start
+
+    # The server allows a burst of server_rate requests and server_rate per second after that
+    ideal = max(count - server_rate, 0) / server_rate
+    print(f"client rate {client_rate:g}/s: {count} requests in {seconds:.2f}s, ideaal {ideal:.2f}s "
+          f"({ideal / seconds:.0%} van de toegestane doorvoer), {stub.throttled} keer 429, {statuses.count(200)} geslaagd")
+
+if __name__ == "__main__":
+    server_rate = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    run(server_rate, server_rate, count, workers)
+    # Without a client-side budget the workers only slow down after a 429
+    run(server_rate, server_rate * 100, count, workers)
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+# python benchmarks/bench_stock_mutations.py [combinations...]
+# Time of compute_mutations against the row-by-row fill_missing_combinations and inner merge from before,
+# on synthetic start and end snapshots
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, '..', 'tests'), os.path.join(BENCH_DIR, '..')]
+
+import pandas as pd
+from stock_overview import KEYS, compute_mutations
+from synthetic_stock import make_stock_snapshots
+
+def legacy_mutations(starting_stock: pd.DataFrame, end_stock: pd.DataFrame) -> pd.DataFrame:
+    # What the script did before: append every missing combination as a row, then an inner merge
+    # DataFrame._append is gone from pandas, a concat per row copies the frame in the same way
+    products_start = set(zip(starting_stock['Product'], starting_stock['Batch']))
+    products_end = set(zip(end_stock['Product'], end_stock['Batch']))
+    for product, batch in products_end - products_start:
+        starting_stock = pd.concat([starting_stock, pd.DataFrame([{'Product': product, 'Batch': batch, 'Aantal': 0}])], ignore_index=True)
+    for product, batch in products_start - products_end:
+        end_stock = pd.concat([end_stock, pd.DataFrame([{'Product': product, 'Batch': batch, 'Aantal': 0}])], ignore_index=True)
+    mutation = end_stock.merge(starting_stock, on=KEYS, suffixes=('_end', '_start'))
+    mutation['Aantal'] = mutation['Aantal_end'] - mutation['Aantal_start']
+    return mutation
+
+def timed(function) -> tuple[float, pd.DataFrame]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def run(combinations: int) -> None:
+    # Every line has a batch here, the old merge dropped lines without one and the results would differ
+    starting_stock, end_stock = make_stock_snapshots(combinations, without_batch=0)
+    legacy, old = timed(lambda: legacy_mutations(starting_stock, end_stock))
+    new, stock = timed(lambda: compute_mutations(starting_stock, end_stock))
+    same = old.set_index(KEYS)['Aantal'].sort_index().equals(stock.set_index(KEYS)['Aantal'].astype(old['Aantal'].dtype).sort_index())
+    print(f"{combinations:,} combinaties ({len(stock):,} regels na de join): oud {legacy:.2f}s, nieuw {new:.2f}s, "
+          f"mutaties {'gelijk' if same else 'VERSCHILLEND'}")
+
+if __name__ == "__main__":
+    for combinations in [int(arg) for arg in sys.argv[1:]] or [100_000]:
+        run(combinations)
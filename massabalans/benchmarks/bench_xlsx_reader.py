@@ -0,0 +1,71 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+# python benchmarks/bench_xlsx_reader.py [synthetic rows]
+# Wall time and peak RSS of read_xlsx_report against the old strip-styles-and-read_excel route,
+# on the Monta Inbound and Sales exports and on a synthetic report, every read in its own process
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCH_DIR, '..')
+sys.path[:0] = [os.path.join(ROOT_DIR, 'oud')]
+
+FIXTURES = [os.path.join(ROOT_DIR, 'oud', 'Inbound 2024-06-17.xlsx'), os.path.join(ROOT_DIR, 'oud', 'Sales 2024-06-17.xlsx')]
+
+def read_old(path: str):
+    # What the scripts did before: unpack, drop styles.xml, pack again and let openpyxl parse the copy
+    import pandas as pd
+    with tempfile.TemporaryDirectory() as temp_dir:
+        extracted = os.path.join(temp_dir, 'extracted')
+        with zipfile.ZipFile(path, 'r') as archive:
+            archive.extractall(extracted)
+        styles_path = os.path.join(extracted, 'xl', 'styles.xml')
+        if os.path.exists(styles_path):
+            os.remove(styles_path)
+        cleaned = shutil.make_archive(os.path.join(temp_dir, 'cleaned'), 'zip', extracted)
+        return pd.read_excel(cleaned, engine='openpyxl')
+
+def read_new(path: str):
+    from xlsx_reader import read_xlsx_report
+    return read_xlsx_report(path)
+
+def write_synthetic(path: str, rows: int) -> None:
+    # A sales export with Excel serial dates, written in openpyxl's streaming mode
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['OrderNummer', 'Besteldatum', 'Verzenddatum', 'SKU', 'Omschrijving', 'Aantal', 'Batch', 'THT Datum', 'Orderstatus'])
+    for row in range(rows):
+        sheet.append([str(100000 + row // 3), 45444 + row % 30, 45445 + row % 30, f'87193263{row % 40:05d}',
+                      f'Product {row % 40}', 1 + row % 5, f'B{row % 7}', 45644 + row % 7, 'Verzonden'])
+    workbook.save(path)
+
+def measure(method: str, path: str) -> None:
+    # Runs in a child process, so peak RSS belongs to this read alone
+    from run_metrics import peak_rss_mb
+    start = time.perf_counter()
+    df = {'old': read_old, 'new': read_new}[method](path)
+    print(f"{time.perf_counter() - start:.2f} {peak_rss_mb():.0f} {len(df)}")
+
+def run(path: str) -> None:
+    results = {}
+    for method in ('old', 'new'):
+        output = subprocess.run([sys.executable, __file__, '--measure', method, path], capture_output=True, text=True, check=True)
+        seconds, rss, rows = output.stdout.split()[-3:]
+        results[method] = f"{float(seconds):.2f}s / {rss} MB"
+    print(f"{os.path.basename(path)} ({rows} rijen): oud {results['old']}, nieuw {results['new']}")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--measure']:
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+        for fixture in FIXTURES:
+            run(fixture)
+        with tempfile.TemporaryDirectory() as folder:
+            synthetic = os.path.join(folder, 'synthetic.xlsx')
+            write_synthetic(synthetic, rows)
+            run(synthetic)
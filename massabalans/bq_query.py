@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime
+from typing import Optional
+import pandas as pd
+from google.cloud import bigquery
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def _param_type(value) -> str:
+    # Order matters: bool is an int and datetime is a date
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, int):
+        return 'INT64'
+    if isinstance(value, float):
+        return 'FLOAT64'
+    if isinstance(value, datetime):
+        return 'TIMESTAMP'
+    if isinstance(value, date):
+        return 'DATE'
+    return 'STRING'
+
+def query_parameters(params: dict) -> list[bigquery.ScalarQueryParameter]:
+    return [bigquery.ScalarQueryParameter(name, _param_type(value), value) for name, value in params.items()]
+
+def cache_key(sql: str, params: dict) -> str:
+    # The same SQL with the same typed parameters always gives the same key
+    typed = {name: [_param_type(value), str(value)] for name, value in params.items()}
+    payload = json.dumps({'sql': ' '.join(sql.split()), 'params': typed}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def dry_run_bytes(client, sql: str, params: dict) -> int:
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False, query_parameters=query_parameters(params))
+    job = client.query(sql, job_config=job_config)
+    return job.total_bytes_processed or 0
+
+def run_query(client, sql: str, params: Optional[dict] = None, max_bytes: Optional[int] = None, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    # Dry run first and refuse the query if it scans more than max_bytes
+    # With a cache_dir the result is stored as Parquet and a repeated run doesn't touch BigQuery at all
+    params = params or {}
+    cache_path = os.path.join(cache_dir, f"{cache_key(sql, params)}.parquet") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        print(f"Queryresultaat uit cache: {cache_path}")
+        return pd.read_parquet(cache_path)
+
+    scanned = dry_run_bytes(client, sql, params)
+    print(f"Query scant {scanned / 1024**2:.1f} MB")
+    if max_bytes is not None and scanned > max_bytes:
+        raise QueryBudgetExceeded(f"Query scant {scanned} bytes, het budget is {max_bytes} bytes")
+
+    # maximum_bytes_billed lets BigQuery enforce the same budget on the real run
+    # It is only set with a budget, the client would send None as the text 'None'
+    job_config = bigquery.QueryJobConfig(query_parameters=query_parameters(params))
+    if max_bytes is not None:
+        job_config.maximum_bytes_billed = max_bytes
+    result = client.query(sql, job_config=job_config).to_dataframe()
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.tmp"
+        result.to_parquet(temp_path, index=False)
+        os.replace(temp_path, cache_path)
+    return result
+
+def max_bytes_from_env() -> Optional[int]:
+    # BQ_MAX_BYTES=0 or unset means no budget
+    max_bytes = int(os.getenv("BQ_MAX_BYTES", "0"))
+    return max_bytes or None
@@ -0,0 +1,113 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from google.oauth2 import service_account
+from google.cloud import bigquery
+from tabulate import tabulate
+from bq_query import run_query, max_bytes_from_env
+from stock_overview import stock_mutation_query
+from xlsx_reader import read_xlsx_report
+from product_dimension import get_product_dimension
+from run_metrics import get_run_metrics
+
+# Load .env
+load_dotenv()
+
+# Every source is brought back to these columns
+KEYS = ['Product', 'Batch']
+
+# opening + inbound - sales + sellable returns - closing = discrepancy
+SOURCES = ['Begin', 'Inbound', 'Verkoop', 'Retour', 'Eind']
+SIGNS = np.array([1, 1, -1, 1, -1])
+
+def _key_text(values: pd.Series) -> pd.Series:
+    # Same text for the same key in every source: '1234', 1234 and 1234.0 are one batch, a missing batch is ''
+    if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+        values = values.astype('Int64')
+    # Text columns can hold a float batch as well, '1234.0' is written back as '1234'
+    values = values.astype('string').str.strip().str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+    return values.fillna('')
+
+def normalise(df: pd.DataFrame, product: str, batch: str, quantity: str) -> pd.DataFrame:
+    # Known products get their id from products.json, whether the source has an EAN, a name or a bulk SKU
+    product_ids = pd.Series(get_product_dimension().lookup(df[product]), index=df.index).astype(object)
+    return pd.DataFrame({
+        'Product': product_ids.fillna(_key_text(df[product])),
+        'Batch': _key_text(df[batch]),
+        'Aantal': pd.to_numeric(df[quantity], errors='coerce').fillna(0),
+    })
+
+def load_inbound(path: str) -> pd.DataFrame:
+    return normalise(read_xlsx_report(path), 'SKU', 'Batch', 'Qty')
+
+def load_sales(path: str) -> pd.DataFrame:
+    return normalise(read_xlsx_report(path), 'SKU', 'Batch', 'Aantal')
+
+def load_returns(path: str) -> pd.DataFrame:
+    # Only sellable returns go back into stock
+    df = read_xlsx_report(path)
+    df = df[df['Sellable'].str.contains('Opgeboekt bij voorraad: Verkoopbaar', na=False)]
+    return normalise(df, 'SKU', 'LOT nr', 'Qty')
+
+def reconcile(sources: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    # Stack all sources and sum them per Product/Batch and source in one groupby
+    # A batch that is missing in a source counts as 0 there
+    stacked = pd.concat([df[KEYS + ['Aantal']].assign(Bron=name) for name, df in sources.items()], ignore_index=True)
+    stacked['Bron'] = pd.Categorical(stacked['Bron'], categories=SOURCES)
+
+    balance = stacked.groupby(KEYS + ['Bron'], observed=False, sort=False)['Aantal'].sum().unstack('Bron', fill_value=0)
+    balance = balance.reindex(columns=SOURCES, fill_value=0)
+    balance.columns = list(balance.columns)
+    balance['Verschil'] = balance[SOURCES].to_numpy() @ SIGNS
+    return balance.reset_index().sort_values(KEYS, ignore_index=True)
+
+if __name__ == "__main__":
+    # The Monta report readers live in oud/: PYTHONPATH=oud python mass_balance.py
+    # Period of the balance
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    first_day = datetime.strptime(start_date, "%Y-%m-%d").date()
+    last_day = datetime.strptime(end_date, "%Y-%m-%d").date()
+
+    # Monta reports over the same period
+    report_folder = os.getenv("CSV_MAIN_PATH", "")
+    metrics = get_run_metrics()
+    with metrics.stage('xlsx_parse') as stage:
+        inbound = load_inbound(os.path.join(report_folder, os.getenv("INBOUND_FILE", f"Inbound {end_date}.xlsx")))
+        sales = load_sales(os.path.join(report_folder, os.getenv("SALES_FILE", f"Sales {end_date}.xlsx")))
+        returns = load_returns(os.path.join(report_folder, os.getenv("RETURNS_FILE", f"Returns {end_date}.xlsx")))
+        stage['rows'] = len(inbound) + len(sales) + len(returns)
+
+    # Get the GCP keys
+    gc_keys = os.getenv("AARDG_GOOGLE_CREDENTIALS")
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gc_keys
+
+    credentials = service_account.Credentials.from_service_account_file(gc_keys)
+    project_id = credentials.project_id
+    client = bigquery.Client(credentials=credentials, project=project_id)
+
+    # Opening and closing stock in one query
+    full_table_id = f'{project_id}.{os.getenv("STOCK_DATASET_ID")}.{os.getenv("STOCK_TABLE_ID")}'
+    params = {'start_date': first_day, 'end_date': last_day}
+    with metrics.stage('bigquery_query') as stage:
+        stock = run_query(client, stock_mutation_query(full_table_id), params, max_bytes_from_env())
+        stage['rows'] = len(stock)
+
+    with metrics.stage('aggregation') as stage:
+        balance = reconcile({
+            'Begin': normalise(stock, 'Product', 'Batch', 'Aantal_start'),
+            'Inbound': inbound,
+            'Verkoop': sales,
+            'Retour': returns,
+            'Eind': normalise(stock, 'Product', 'Batch', 'Aantal_end'),
+        })
+        stage['rows'] = len(balance)
+
+    output_path = os.getenv("MASSABALANS_OUTPUT", "massabalans.csv")
+    balance.to_csv(output_path, index=False)
+
+    discrepancies = balance[balance['Verschil'] != 0]
+    print(tabulate(discrepancies, headers='keys', showindex=False, tablefmt='grid'))
+    print(f"{len(discrepancies)} van {len(balance)} batches kloppen niet, volledige massabalans in {output_path}")
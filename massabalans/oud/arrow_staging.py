@@ -0,0 +1,148 @@
+import os
+from typing import Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+# Repeating text (SKU's, descriptions, statuses) is stored once per file, rows only keep an index
+DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+
+# Sales lines from the Monta report, as they are staged before the MERGE
+SALES_LINES_SCHEMA = pa.schema([
+    ('OrderNummer', pa.string()),
+    ('Besteldatum', pa.date32()),
+    ('Verzenddatum', pa.date32()),
+    ('SKU', DICTIONARY),
+    ('Omschrijving', DICTIONARY),
+    ('Aantal', pa.int64()),
+    ('Batch', DICTIONARY),
+    ('THT_Datum', pa.date32()),
+    ('Orderstatus', DICTIONARY),
+])
+
+# A sales line in the warehouse is identified by these columns, later exports may only change these values
+SALES_LINE_KEYS = ['OrderNummer', 'SKU', 'Batch', 'THT_Datum']
+SALES_LINE_UPDATES = ['Verzenddatum', 'Orderstatus', 'Aantal']
+
+# Order rows from the Monta API, ordered/shipped stay text because the table has always stored them like that
+ORDER_ROWS_SCHEMA = pa.schema([
+    ('order_id', pa.string()),
+    ('first_name', pa.string()),
+    ('last_name', pa.string()),
+    ('email', pa.string()),
+    ('street', pa.string()),
+    ('house_number', pa.string()),
+    ('house_number_addition', pa.string()),
+    ('postal_code', pa.string()),
+    ('city', DICTIONARY),
+    ('country', DICTIONARY),
+    ('ordered', pa.string()),
+    ('shipped', pa.string()),
+    ('sku', DICTIONARY),
+    ('quantity', pa.int64()),
+    ('batch_title', DICTIONARY),
+    ('batch_bestbeforedate', DICTIONARY),
+    ('product_name', DICTIONARY),
+])
+
+# One row per batch line of an order
+ORDER_ROW_KEYS = ['order_id', 'sku', 'batch_title', 'batch_bestbeforedate']
+
+# Legacy names that BigQuery still reports for columns of older tables
+LEGACY_TYPES = {'INTEGER': 'INT64', 'FLOAT': 'FLOAT64', 'BOOLEAN': 'BOOL'}
+
+def _column(values: pd.Series, type_: pa.DataType) -> pa.Array:
+    if pa.types.is_string(type_) or pa.types.is_dictionary(type_):
+        # Numbers that pandas inferred (order numbers, EAN's) are staged as their text,
+        # 1234.0 as '1234' so a target column that holds them as INT64 can cast them back
+        if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+            values = values.astype('Int64')
+        elif values.dtype == object:
+            values = values.map(lambda value: int(value) if isinstance(value, float) and value.is_integer() else value)
+        values = values.astype('string')
+    elif pa.types.is_date(type_):
+        values = pd.to_datetime(values)
+    return pa.array(values, type=type_, from_pandas=True)
+
+def to_arrow(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    # Missing columns are staged as nulls, extra columns are left out
+    columns = [
+        _column(df[field.name], field.type) if field.name in df.columns else pa.nulls(len(df), field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def write_parquet(table: pa.Table, path: str) -> None:
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    pq.write_table(table, temp_path, compression='zstd')
+    os.replace(temp_path, path)
+
+def load_parquet(client, path: str, table_id: str, write_disposition: str = bigquery.WriteDisposition.WRITE_APPEND) -> bigquery.LoadJob:
+    # One load job for the whole file instead of streaming rows
+    job_config = bigquery.LoadJobConfig(source_format=bigquery.SourceFormat.PARQUET, write_disposition=write_disposition)
+    with open(path, 'rb') as file:
+        job = client.load_table_from_file(file, table_id, job_config=job_config)
+    job.result()
+    print(f"{job.output_rows} rijen geladen in {table_id}.")
+    return job
+
+def stage_frame(client, df: pd.DataFrame, schema: pa.Schema, table_id: str, staging_dir: str, write_disposition: str = bigquery.WriteDisposition.WRITE_APPEND) -> str:
+    # Type the frame, keep it as Parquet in staging_dir and load that file into table_id
+    path = os.path.join(staging_dir, f"{table_id.split('.')[-1]}.parquet")
+    write_parquet(to_arrow(df, schema), path)
+    load_parquet(client, path, table_id, write_disposition)
+    return path
+
+def bigquery_type(type_: pa.DataType) -> str:
+    # The BigQuery type a staged Arrow column is loaded as
+    if pa.types.is_dictionary(type_) or pa.types.is_string(type_):
+        return 'STRING'
+    if pa.types.is_date(type_):
+        return 'DATE'
+    if pa.types.is_integer(type_):
+        return 'INT64'
+    if pa.types.is_floating(type_):
+        return 'FLOAT64'
+    if pa.types.is_boolean(type_):
+        return 'BOOL'
+    if pa.types.is_timestamp(type_):
+        return 'TIMESTAMP'
+    raise ValueError(f"Geen BigQuery type voor {type_}")
+
+def table_types(client, table_id: str) -> dict[str, str]:
+    # Column types of an existing table, empty when the table doesn't exist yet
+    try:
+        table = client.get_table(table_id)
+    except NotFound:
+        return {}
+    return {field.name: LEGACY_TYPES.get(field.field_type, field.field_type) for field in table.schema}
+
+def target_select_sql(table_id: str, schema: pa.Schema, target_types: Optional[dict[str, str]] = None,
+                      date_columns: tuple = (), blank_columns: tuple = ()) -> str:
+    # SELECT over a typed staging table that gives every column back in the type of the target table
+    # Older tables were created by pandas_gbq, which may have inferred INT64 or FLOAT64 for order numbers, SKU's or batches
+    # date_columns become 'YYYY-MM-DD' text when the target doesn't exist yet, like the warehouse tables store them,
+    # and missing dates in blank_columns become '' instead of NULL
+    target_types = target_types or {}
+    replacements = []
+    for field in schema:
+        column = field.name
+        staged = bigquery_type(field.type)
+        target = target_types.get(column, 'STRING' if column in date_columns else staged)
+        if target == staged:
+            continue
+        if staged == 'DATE' and target == 'STRING':
+            converted = f"FORMAT_DATE('%Y-%m-%d', {column})"
+            if column in blank_columns:
+                converted = f"IFNULL({converted}, '')"
+        else:
+            converted = f"CAST({column} AS {target})"
+        replacements.append(f"{converted} AS {column}")
+    if not replacements:
+        return f"SELECT * FROM `{table_id}`"
+    return f"SELECT * REPLACE ({', '.join(replacements)}) FROM `{table_id}`"
@@ -0,0 +1,111 @@
+import os
+from datetime import datetime
+from typing import Optional
+import pandas as pd
+from dotenv import load_dotenv
+from checkpoint_store import CheckpointStore
+from report_download import file_digest
+from report_pipeline import REPORT_SPECS, find_reports, parse_reports, report_date, write_report
+
+# Load .env
+load_dotenv()
+
+# Report types that are picked up from the folder
+BATCH_REPORTS = ['inbound', 'sales', 'returns']
+
+class IngestLedger:
+    # Which file was processed for every report date, with its content hash and its parsed result kept next to the ledger
+    # Renaming or copying a processed file doesn't make it new, a re-export or re-download of the same date
+    # with different content replaces the earlier result
+    def __init__(self, path: str, cache_dir: str):
+        self.store = CheckpointStore(path)
+        self.cache_dir = cache_dir
+
+    def processed(self, report_name: str) -> dict[str, dict]:
+        return self.store.load(report_name) or {}
+
+    def result_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.pkl")
+
+    def load_results(self, report_name: str, dates: list[str]) -> list[pd.DataFrame]:
+        frames = []
+        processed = self.processed(report_name)
+        for date in dates:
+            entry = processed[date]
+            if os.path.exists(self.result_path(entry['digest'])):
+                frames.append(pd.read_pickle(self.result_path(entry['digest'])))
+            else:
+                print(f"Resultaat van {entry['file']} ontbreekt in {self.cache_dir}, het bestand telt niet mee")
+        return frames
+
+    def mark(self, report_name: str, files: dict[str, tuple[str, str, pd.DataFrame]], removed: list[str] = ()) -> None:
+        # files maps a report date to its path, content hash and result, removed are report dates that left the folder
+        # Results are written before the ledger, so a ledger entry always has its result
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = self.processed(report_name)
+        old_digests = {entries[date]['digest'] for date in [*files, *removed] if date in entries}
+        for date, (path, digest, df) in files.items():
+            df.to_pickle(self.result_path(digest))
+            entries[date] = {'file': os.path.basename(path), 'digest': digest, 'processed': datetime.now().isoformat(timespec='seconds')}
+        for date in removed:
+            entries.pop(date, None)
+        self.store.save(report_name, entries)
+
+        # Results that no entry points to anymore are removed after the ledger is saved
+        for digest in old_digests - {entry['digest'] for entry in entries.values()}:
+            if os.path.exists(self.result_path(digest)):
+                os.remove(self.result_path(digest))
+
+def report_files(report_name: str, folder: str) -> dict[str, str]:
+    # One file per report date, the most recently modified one when a date was exported more than once
+    files = {}
+    for path in find_reports(REPORT_SPECS[report_name], folder):
+        date = report_date(path)
+        if date not in files or os.path.getmtime(path) >= os.path.getmtime(files[date]):
+            files[date] = path
+    return files
+
+def changed_reports(report_name: str, folder: str, ledger: IngestLedger) -> tuple[dict[str, tuple[str, str]], list[str]]:
+    # Report dates whose file is new or has other content than when it was processed, with its path and content hash,
+    # and the processed report dates whose file is no longer in the folder
+    processed = ledger.processed(report_name)
+    files = report_files(report_name, folder)
+    changed = {}
+    for date, path in files.items():
+        digest = file_digest(path)
+        if processed.get(date, {}).get('digest') != digest:
+            changed[date] = (path, digest)
+    removed = [date for date in processed if date not in files]
+    return changed, removed
+
+def ingest_folder(folder: str, ledger: IngestLedger, report_names: list[str] = BATCH_REPORTS, max_workers: Optional[int] = None) -> dict[str, int]:
+    # Parse all new and changed files in worker processes and upload every report type once,
+    # together with the results of the unchanged files that were processed before
+    ingested = {}
+    for report_name in report_names:
+        spec = REPORT_SPECS[report_name]
+        changed, removed = changed_reports(report_name, folder, ledger)
+        if not changed and not removed:
+            print(f"{spec.file_prefix}: geen nieuwe bestanden")
+            ingested[report_name] = 0
+            continue
+
+        print(f"{spec.file_prefix}: {len(changed)} nieuwe of gewijzigde bestanden, {len(removed)} verdwenen")
+        unchanged = [date for date in ledger.processed(report_name) if date not in changed and date not in removed]
+        frames, timings = parse_reports(spec, [path for path, _ in changed.values()], max_workers) if changed else ([], {})
+        results = ledger.load_results(report_name, unchanged) + frames
+        if results:
+            write_report(spec, results, timings)
+        else:
+            print(f"{spec.file_prefix}: geen bestanden meer over, er is niets geüpload")
+
+        # Only after a successful upload the files count as processed
+        ledger.mark(report_name, {date: (path, digest, df) for (date, (path, digest)), df in zip(changed.items(), frames)}, removed)
+        ingested[report_name] = len(changed)
+    return ingested
+
+if __name__ == "__main__":
+    report_folder = os.getenv("CSV_MAIN_PATH", "")
+    ledger = IngestLedger(os.getenv("BATCH_LEDGER_PATH", "batch_ingest.json"), os.getenv("BATCH_CACHE_DIR", "batch_cache"))
+    max_workers = int(os.getenv("BATCH_MAX_WORKERS", "0")) or None
+    ingest_folder(report_folder, ledger, max_workers=max_workers)
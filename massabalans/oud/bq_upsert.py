@@ -0,0 +1,108 @@
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+import pandas as pd
+import pyarrow as pa
+from google.cloud import bigquery
+from arrow_staging import stage_frame, table_types, target_select_sql
+from run_metrics import get_run_metrics
+
+# Rows per Parquet file and load job while staging
+DEFAULT_CHUNK_ROWS = 500_000
+
+# A staging table that survives a killed run is removed by BigQuery itself after this time
+STAGING_EXPIRATION = timedelta(days=1)
+
+def staging_table_id(table_id: str) -> str:
+    # A unique table next to the target for every run, so concurrent runs never share a staging table
+    prefix, table = table_id.rsplit('.', 1)
+    return f"{prefix}._staging_{table}_{uuid.uuid4().hex[:12]}"
+
+def merge_sql(table_id: str, source_query: str, columns: list[str], keys: list[str], update_columns: list[str]) -> str:
+    # Keys match NULL to NULL, matched rows are only rewritten when one of their values really changed
+    on = ' AND '.join(f"target.{key} IS NOT DISTINCT FROM source.{key}" for key in keys)
+    changed = ' OR '.join(f"target.{column} IS DISTINCT FROM source.{column}" for column in update_columns)
+    updates = ', '.join(f"target.{column} = source.{column}" for column in update_columns)
+    matched = f"WHEN MATCHED AND ({changed}) THEN\n  UPDATE SET {updates}\n" if update_columns else ''
+    return f"""
+MERGE INTO `{table_id}` AS target
+USING ({source_query}) AS source
+ON {on}
+{matched}WHEN NOT MATCHED THEN
+  INSERT ({', '.join(columns)})
+  VALUES ({', '.join(f'source.{column}' for column in columns)})
+"""
+
+@contextmanager
+def staged_frame(client, df: pd.DataFrame, schema: pa.Schema, table_id: str, staging_dir: str,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[str]:
+    # Load df into a per-run staging table next to table_id and yield its id, the staging table is always dropped afterwards
+    metrics = get_run_metrics()
+    staging_id = staging_table_id(table_id)
+    staged_path = None
+    try:
+        with metrics.stage('bigquery_load', table=table_id, rows=len(df)) as stage:
+            stage['bytes'] = 0
+            for start in range(0, max(len(df), 1), chunk_rows):
+                disposition = bigquery.WriteDisposition.WRITE_TRUNCATE if start == 0 else bigquery.WriteDisposition.WRITE_APPEND
+                staged_path = stage_frame(client, df.iloc[start:start + chunk_rows], schema, staging_id, staging_dir, disposition)
+                stage['bytes'] += os.path.getsize(staged_path)
+                if start == 0:
+                    staging_table = client.get_table(staging_id)
+                    staging_table.expires = datetime.now(timezone.utc) + STAGING_EXPIRATION
+                    client.update_table(staging_table, ['expires'])
+        yield staging_id
+    finally:
+        try:
+            client.delete_table(staging_id, not_found_ok=True)
+        except Exception as e:
+            print(f"Fout bij het verwijderen van de tijdelijke tabel {staging_id}: {e}")
+        # The staging file has a unique name as well, so it is not kept around
+        if staged_path and os.path.exists(staged_path):
+            os.remove(staged_path)
+
+def upsert_frame(client, df: pd.DataFrame, schema: pa.Schema, table_id: str, keys: list[str], staging_dir: str,
+                 update_columns: Optional[list[str]] = None, date_columns: tuple = (), blank_columns: tuple = (),
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    # Stage df and MERGE it into table_id on keys
+    # Staged columns are cast to the types of an existing target, a new target stores date_columns as 'YYYY-MM-DD' text,
+    # see target_select_sql
+    # Returns the number of inserted or updated rows
+    duplicated = df.duplicated(subset=keys, keep=False)
+    if duplicated.any():
+        raise ValueError(f"{int(duplicated.sum())} rijen hebben dezelfde sleutel {keys}, de MERGE kan ze niet eenduidig verwerken")
+
+    columns = schema.names
+    if update_columns is None:
+        update_columns = [column for column in columns if column not in keys]
+
+    with staged_frame(client, df, schema, table_id, staging_dir, chunk_rows) as staging_id:
+        source_query = target_select_sql(staging_id, schema, table_types(client, table_id), date_columns, blank_columns)
+
+        with get_run_metrics().stage('bigquery_merge', table=table_id) as stage:
+            # A new target gets the columns and types of the staged data
+            client.query(f"CREATE TABLE IF NOT EXISTS `{table_id}` AS {source_query} LIMIT 0").result()
+
+            query_job = client.query(merge_sql(table_id, source_query, columns, keys, update_columns))
+            query_job.result()
+            affected = query_job.num_dml_affected_rows or 0
+            stage['rows'] = affected
+            stage['bytes'] = query_job.total_bytes_processed or 0
+    print(f"{affected} rijen toegevoegd of bijgewerkt in {table_id}.")
+    return affected
+
+def replace_frame(client, df: pd.DataFrame, schema: pa.Schema, table_id: str, staging_dir: str,
+                  date_columns: tuple = (), blank_columns: tuple = (), chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    # Stage df and replace the whole contents of table_id with it in one statement, lines that are no longer in df are gone
+    # An existing target keeps its column types, like in upsert_frame
+    with staged_frame(client, df, schema, table_id, staging_dir, chunk_rows) as staging_id:
+        source_query = target_select_sql(staging_id, schema, table_types(client, table_id), date_columns, blank_columns)
+
+        with get_run_metrics().stage('bigquery_replace', table=table_id, rows=len(df)) as stage:
+            query_job = client.query(f"CREATE OR REPLACE TABLE `{table_id}` AS {source_query}")
+            query_job.result()
+            stage['bytes'] = query_job.total_bytes_processed or 0
+    print(f"{len(df)} rijen geschreven naar {table_id}, de vorige inhoud is vervangen.")
+    return len(df)
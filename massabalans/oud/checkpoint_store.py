@@ -0,0 +1,35 @@
+import json
+import os
+import threading
+from typing import Optional
+
+class CheckpointStore:
+    # Small JSON file with one checkpoint per sync, written atomically so a crash never leaves half a file
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _read_all(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Checkpoint {self.path} kon niet worden gelezen: {e}")
+            return {}
+
+    def load(self, name: str) -> Optional[dict]:
+        with self.lock:
+            return self._read_all().get(name)
+
+    def save(self, name: str, checkpoint: dict) -> None:
+        with self.lock:
+            checkpoints = self._read_all()
+            checkpoints[name] = checkpoint
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as file:
+                json.dump(checkpoints, file, indent=2)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
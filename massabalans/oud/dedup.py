@@ -0,0 +1,17 @@
+import pandas as pd
+
+def collapse_duplicates(df: pd.DataFrame, keys: list[str], value: str = 'Aantal') -> pd.DataFrame:
+    # Lines that agree on keys become one line, their value is added up
+    # One groupby hashes the keys once, rows without duplicates are groups of one
+    # Missing keys form their own group like in drop_duplicates, lines keep the order of their first occurrence
+    # min_count=1 keeps a missing Aantal missing instead of turning it into 0
+    grouped = df.groupby(keys, sort=False, dropna=False, observed=True)
+    others = [column for column in df.columns if column not in keys and column != value]
+    if not others:
+        collapsed = grouped[value].sum(min_count=1).reset_index()
+    else:
+        # Other columns come from the first line of the group, as a whole line so missing values aren't filled in from the next one
+        collapsed = grouped[others].first(skipna=False).reset_index()
+        # Both aggregations list the groups in the same order
+        collapsed[value] = grouped[value].sum(min_count=1).to_numpy()
+    return collapsed[[column for column in df.columns if column in collapsed.columns]]
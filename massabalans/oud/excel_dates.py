@@ -0,0 +1,19 @@
+import pandas as pd
+
+# Day zero of Excel's serial date system
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+def excel_to_date(values: pd.Series) -> pd.Series:
+    # Convert a whole column of Excel serial dates to datetime64 at midnight
+    # Numbers (also numeric strings) are serials, real dates and date strings are parsed, the rest becomes NaT
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.floor('D')
+
+    serials = pd.to_numeric(values, errors='coerce')
+    dates = pd.to_datetime(serials, unit='D', origin=EXCEL_EPOCH)
+
+    remaining = serials.isna() & values.notna()
+    if remaining.any():
+        dates[remaining] = pd.to_datetime(values[remaining], errors='coerce', format='mixed')
+
+    return dates.dt.floor('D')
@@ -1,21 +1,17 @@
-import requests
-from requests.auth import HTTPBasicAuth
 from dotenv import load_dotenv
-import os
+from monta_client import get_monta_client
+from run_metrics import get_run_metrics
 
 # Import keys.env
 load_dotenv()
 
 # Define variables
-api_url = os.getenv("MONTA_API_URL", "")
-username = os.getenv("MONTA_USERNAME", "")
-password = os.getenv("MONTA_PASSWORD", "")
+monta_client = get_monta_client()
 
 def retrieve_inboud():
     endpoint = 'inbounds?sinceid=1'
-    full_url = api_url + endpoint
-    print(full_url)
-    response = requests.get(full_url, auth=HTTPBasicAuth(username, password))
+    print(monta_client.api_url + endpoint)
+    response = monta_client.get(endpoint)
     
     if response.status_code == 200:
         return response.json()
@@ -24,4 +20,7 @@ def retrieve_inboud():
         return None
 
 if __name__ == "__main__":
-    print(retrieve_inboud())
\ No newline at end of file
+    with get_run_metrics().stage('inbound_fetch') as stage:
+        inbounds = retrieve_inboud()
+        stage['rows'] = len(inbounds) if inbounds is not None else 0
+    print(inbounds)
@@ -1,26 +1,21 @@
-import requests
-from requests.auth import HTTPBasicAuth
 import json
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 from typing import List, Optional
+from monta_client import get_monta_client
+from report_download import download_report, download_reports
+from run_metrics import get_run_metrics
 
 # Import keys.env
 load_dotenv()
 
 # Define variables
-api_url: str = os.getenv("MONTA_API_URL", "")
-username: str = os.getenv("MONTA_USERNAME", "")
-password: str = os.getenv("MONTA_PASSWORD", "")
-
-if api_url is None or username is None or password is None:
-    raise ValueError("API URL, username, or password environment variables are not set.")
+monta_client = get_monta_client()
 
 def fetch_report_details(created_after: str):
     endpoint = f"reports?createdAfter={created_after}"
-    full_url = api_url + endpoint
-    response = requests.get(full_url, auth=HTTPBasicAuth(username, password))
+    response = monta_client.get(endpoint)
     
     if response.status_code == 200:
         return response.json()
@@ -30,8 +25,7 @@ def fetch_report_details(created_after: str):
 
 def fetch_report(report_id: str):
     endpoint = f"reports/{report_id}/file"
-    full_url = api_url + endpoint
-    response = requests.get(full_url, auth=HTTPBasicAuth(username, password))
+    response = monta_client.get(endpoint)
     
     if response.status_code == 200:
         return response.content
@@ -39,25 +33,32 @@ def fetch_report(report_id: str):
         print(f"Failed to fetch report: {response.status_code} - {response.text}")
         return None
 
-# Generate report details
-created_after = "2023-01-01T00:48:45.107"
-report_details = fetch_report_details(created_after)
-print(report_details)
-
-# Extract report ID
-if report_details:
-    report_id = report_details[0]['Id']
-    print("Report ID:", report_id)
+if __name__ == "__main__":
+    # Generate report details
+    created_after = "2023-01-01T00:48:45.107"
+    report_details = fetch_report_details(created_after)
+    print(report_details)
 
-    # Use report ID to retrieve report
-    report_content = fetch_report(report_id)
-    
-    if report_content:
-        # Save the report content to a file
-        with open('report_file.csv', 'wb') as file:
-            file.write(report_content)
-        print("Report has been saved to 'report_file.csv'.")
+    if not report_details:
+        print("No report found.")
+    elif os.getenv("MONTA_REPORT_DOWNLOAD", "latest") == 'all':
+        # Every report, several at the same time, each to its own file
+        folder = os.getenv("MONTA_REPORT_FOLDER", "reports")
+        max_workers = int(os.getenv("MONTA_REPORT_WORKERS", "4"))
+        with get_run_metrics().stage('report_download', reports=len(report_details)) as stage:
+            results = download_reports(monta_client, report_details, folder, max_workers)
+            stage['bytes'] = sum(os.path.getsize(path) for path in results.values() if path is not None)
+        failed = [report_id for report_id, path in results.items() if path is None]
+        if failed:
+            print(f"{len(failed)} reports could not be downloaded: {failed}")
     else:
-        print("Failed to download the report.")
-else:
-    print("No report found.")
\ No newline at end of file
+        # Extract report ID
+        report_id = report_details[0]['Id']
+        print("Report ID:", report_id)
+
+        # Stream the report straight to disk
+        with get_run_metrics().stage('report_download', reports=1) as stage:
+            path = download_report(monta_client, report_id, 'report_file.csv')
+            stage['bytes'] = os.path.getsize(path) if path is not None else 0
+        if path is None:
+            print("Failed to download the report.")
@@ -0,0 +1,162 @@
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from dotenv import load_dotenv
+import os
+import threading
+import time
+from typing import Optional
+from rate_limit import TokenBucket, parse_retry_after, backoff_delay
+from response_cache import ResponseCache
+from run_metrics import get_run_metrics
+
+# Import keys.env
+load_dotenv()
+
+# Responses that are worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class MontaClient:
+    # One pooled session with keep-alive connections, shared by all Monta calls
+    # All threads using the client draw from the same rate limit budget
+    # With a cache, responses of immutable endpoints are served from disk
+    def __init__(self, api_url: str, username: str, password: str, pool_size: int = 32, timeout: float = 60,
+                 rate_limit: float = 10, max_retries: int = 5, cache: Optional[ResponseCache] = None):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_limit)
+        self.max_retries = max_retries
+        self.cache = cache
+
+        # Requests sent, retries and response bytes (by Content-Length) since the client was created
+        self.stats = {'requests': 0, 'retries': 0, 'bytes': 0}
+        self.stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(username, password)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, endpoint: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.api_url + endpoint
+
+        # Streams and requests with their own headers always go to the server
+        if self.cache is None or kwargs.get('stream') or kwargs.get('headers') or self.cache.ttl_for(endpoint) is None:
+            return self._send(endpoint, url, **kwargs)
+
+        entry = self.cache.lookup(endpoint)
+        if entry is not None and entry['fresh']:
+            self.cache.count('hits')
+            return self.cache.to_response(entry, url)
+
+        # Revalidate a stale copy if the server gave us validators, next to any headers of the caller
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self._send(endpoint, url, headers=headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(endpoint)
+            self.cache.count('revalidated')
+            return self.cache.to_response(entry, url)
+
+        self.cache.count('misses')
+        if response.status_code == 200:
+            self.cache.store(endpoint, response)
+        return response
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[stat] += amount
+
+    def _count_body(self, response: requests.Response, stream: bool) -> None:
+        # Bytes of the body as they are read, after decompression, Content-Length is missing for chunked responses
+        # and only the compressed size for gzip. A streamed body is counted block by block, also when it is read through .content
+        if not stream:
+            self._count('bytes', len(response.content))
+            return
+        iter_content = response.iter_content
+
+        def counted(*args, **kwargs):
+            for block in iter_content(*args, **kwargs):
+                self._count('bytes', len(block))
+                yield block
+        response.iter_content = counted
+
+    def snapshot_stats(self) -> dict:
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def _send(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            if attempt > 0:
+                self._count('retries')
+            self._count('requests')
+            try:
+                response = self.session.get(url, **kwargs)
+                self._count_body(response, kwargs.get('stream', False))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"Request to {endpoint} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None:
+                    # The server told us how long to wait, so hold back every worker
+                    self.bucket.pause(retry_after)
+                    delay = 0
+                else:
+                    delay = backoff_delay(attempt)
+                print(f"Request to {endpoint} returned {response.status_code}, retrying (attempt {attempt + 1})")
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+_default_client: Optional[MontaClient] = None
+
+def get_monta_client() -> MontaClient:
+    # Lazily create the shared client from the environment
+    global _default_client
+    if _default_client is None:
+        cache_path = os.getenv("MONTA_CACHE_PATH")
+        cache = None
+        if cache_path:
+            cache = ResponseCache(cache_path, max_bytes=int(os.getenv("MONTA_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        _default_client = MontaClient(
+            api_url=os.getenv("MONTA_API_URL", ""),
+            username=os.getenv("MONTA_USERNAME", ""),
+            password=os.getenv("MONTA_PASSWORD", ""),
+            pool_size=int(os.getenv("MONTA_POOL_SIZE", "32")),
+            rate_limit=float(os.getenv("MONTA_RATE_LIMIT", "10")),
+            max_retries=int(os.getenv("MONTA_MAX_RETRIES", "5")),
+            cache=cache,
+        )
+        # Every metrics stage gets the requests, retries and bytes of the Monta calls made during it
+        get_run_metrics().add_counter_source('monta', _default_client.snapshot_stats)
+    return _default_client
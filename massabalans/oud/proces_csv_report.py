@@ -5,8 +5,12 @@ import pandas as pd
 import re
 import os
 from dotenv import load_dotenv
+from excel_dates import excel_to_date
+from arrow_staging import SALES_LINES_SCHEMA, SALES_LINE_KEYS, SALES_LINE_UPDATES
+from bq_upsert import upsert_frame
+from dedup import collapse_duplicates
+from run_metrics import get_run_metrics
 from datetime import datetime, timedelta
-import pandas_gbq
 from google.oauth2 import service_account
 from google.cloud import bigquery
 
@@ -18,83 +22,88 @@ report_folder: str = os.getenv("CSV_MAIN_PATH", "")
 original_file: str = "report_file.csv"
 original_report: str = os.path.join(report_folder, original_file)
 
-# Read the CSV file with pandas
-try:
-    df = pd.read_csv(original_report)
-    # Function to turn Excel date into normal date
-    def excel_date(excel_date):
-        return pd.to_datetime('1899-12-30') + pd.to_timedelta(excel_date, 'D')
+# Columns of the Monta export that we use and their names in BigQuery
+csv_columns = {
+    'OrderNummer': 'OrderNummer',
+    'BestelDatum': 'Besteldatum',
+    'Verzenddatum': 'Verzenddatum',
+    'Sku': 'SKU',
+    'Omschrijving': 'Omschrijving',
+    'Aantal': 'Aantal',
+    'Batch': 'Batch',
+    'ThtDatum': 'THT_Datum',
+    'OrderStatus': 'Orderstatus',
+}
 
-    # Pas de functie toe op de relevante kolommen
-    df['BestelDatum'] = df['BestelDatum'].apply(excel_date).dt.strftime('%Y-%m-%d')
-    df['Verzenddatum'] = df['Verzenddatum'].apply(excel_date).dt.strftime('%Y-%m-%d')
-    df['ThtDatum'] = df['ThtDatum'].apply(excel_date).dt.strftime('%Y-%m-%d')
-    
-except Exception as e:
-    print(f"Er is een fout opgetreden bij het inlezen van het CSV-bestand: {e}")
+# Fixed types instead of inference per chunk, EAN's and order numbers stay text
+# The date columns hold Excel serials or date strings and are converted by excel_to_date
+csv_dtypes = {
+    'OrderNummer': 'str',
+    'Sku': 'str',
+    'Omschrijving': 'str',
+    'Aantal': 'Int64',
+    'Batch': 'str',
+    'OrderStatus': 'str',
+}
 
-# Limit to desired columns
-desired_columns = ['OrderNummer', 'BestelDatum', 'Verzenddatum', 'Sku', 'Omschrijving', 'Aantal', 'Batch', 'ThtDatum', 'OrderStatus']
-df = df[desired_columns]
-df['THT_Datum'] = df['ThtDatum'].fillna('')
-df = df.drop(columns=['ThtDatum'])
-df['SKU'] = df['Sku']
-df = df.drop(columns=['Sku'])
-df['Orderstatus'] = df['OrderStatus']
-df = df.drop(columns=['OrderStatus'])
-df['Besteldatum'] = df['BestelDatum']
-df = df.drop(columns=['BestelDatum'])
+# Number of lines that are read at the same time
+chunk_rows = int(os.getenv("CSV_CHUNK_ROWS", "250000"))
 
-# Remove duplicates
-duplicates = df[df.duplicated(subset=['OrderNummer', 'Besteldatum', 'Verzenddatum', 'SKU', 'Omschrijving', 'Batch', 'THT_Datum', 'Orderstatus'], keep=False)]
-duplicates_grouped = duplicates.groupby(['OrderNummer', 'Besteldatum', 'Verzenddatum', 'SKU', 'Omschrijving', 'Batch', 'THT_Datum', 'Orderstatus']).agg({'Aantal': 'sum'}).reset_index()
-df_cleaned = df.drop_duplicates(subset=['OrderNummer', 'Besteldatum', 'Verzenddatum', 'SKU', 'Omschrijving', 'Batch', 'THT_Datum', 'Orderstatus'], keep=False)
-merged_df = pd.concat([df_cleaned, duplicates_grouped], ignore_index=True)
+def read_sales_lines(path: str, chunk_rows: int = chunk_rows) -> pd.DataFrame:
+    # Stream the CSV in chunks and collapse lines with the same MERGE key along the way,
+    # so memory depends on the number of distinct lines and not on the size of the file
+    partials = []
+    pending_rows = 0
+    combined_rows = 0
+    for chunk in pd.read_csv(path, usecols=list(csv_columns), dtype=csv_dtypes, chunksize=chunk_rows):
+        chunk.rename(columns=csv_columns, inplace=True)
+        # Zet de Excel datums per kolom in één keer om
+        for column in ['Besteldatum', 'Verzenddatum', 'THT_Datum']:
+            chunk[column] = excel_to_date(chunk[column])
 
-# Print Merged DataFrame
-print(merged_df)
+        partials.append(chunk)
+        pending_rows += len(chunk)
 
-# Write to BigQuery
-project_id: str = os.getenv("MONTA_PROJECT_ID", "")
-dataset_id: str = os.getenv("MONTA_DATASET_ID", "")
-table_id: str = os.getenv("MONTA_TABLE_ID", "")
-full_table_id: str = f'{project_id}.{dataset_id}.{table_id}'
+        # Collapse once the new chunks hold as many lines as the collapsed result, so every line is only regrouped a few times
+        if pending_rows >= combined_rows:
+            partials = [collapse_duplicates(pd.concat(partials, ignore_index=True), SALES_LINE_KEYS)]
+            combined_rows = len(partials[0])
+            pending_rows = 0
 
-# Get the GCP keys
-gc_keys = os.getenv("AARDG_GOOGLE_CREDENTIALS")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gc_keys
+    if not partials:
+        return pd.DataFrame(columns=list(csv_columns.values()))
+    if pending_rows:
+        partials = [collapse_duplicates(pd.concat(partials, ignore_index=True), SALES_LINE_KEYS)]
+    return partials[0]
 
-credentials = service_account.Credentials.from_service_account_file(gc_keys)
-project_id = credentials.project_id
-client = bigquery.Client(credentials=credentials, project=project_id)
+if __name__ == "__main__":
+    # Read the CSV file and remove duplicates, their Aantal is added up
+    try:
+        with get_run_metrics().stage('csv_read', file=os.path.basename(original_report), bytes=os.path.getsize(original_report)) as stage:
+            merged_df = read_sales_lines(original_report)
+            stage['rows'] = len(merged_df)
+    except Exception as e:
+        print(f"Er is een fout opgetreden bij het inlezen van het CSV-bestand: {e}")
 
-# Write the data to a temporary table
-temp_table_id = f'{dataset_id}.temp_table'
-pandas_gbq.to_gbq(merged_df, temp_table_id, project_id=project_id, if_exists='replace')
+    # Print Merged DataFrame
+    print(merged_df)
 
-# Apply a MERGE query to the temporary and original table
-merge_query = f"""
-MERGE INTO `{full_table_id}` AS target
-USING `{temp_table_id}` AS source
-ON target.OrderNummer = source.OrderNummer AND target.SKU = source.SKU AND target.Batch = source.Batch AND target.THT_Datum = source.THT_Datum
-WHEN MATCHED THEN
-  UPDATE SET target.Verzenddatum = source.Verzenddatum,
-             target.Orderstatus = source.Orderstatus,
-             target.Aantal = source.Aantal
-WHEN NOT MATCHED THEN
-  INSERT (OrderNummer, Besteldatum, Verzenddatum, SKU, Omschrijving, Aantal, Batch, THT_Datum, Orderstatus)
-  VALUES (source.OrderNummer, source.Besteldatum, source.Verzenddatum, source.SKU, source.Omschrijving, source.Aantal, source.Batch, source.THT_Datum, source.Orderstatus);
-"""
+    # Write to BigQuery
+    project_id: str = os.getenv("MONTA_PROJECT_ID", "")
+    dataset_id: str = os.getenv("MONTA_DATASET_ID", "")
+    table_id: str = os.getenv("MONTA_TABLE_ID", "")
+    full_table_id: str = f'{project_id}.{dataset_id}.{table_id}'
 
-# Execute the query
-query_job = client.query(merge_query)
+    # Get the GCP keys
+    gc_keys = os.getenv("AARDG_GOOGLE_CREDENTIALS")
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gc_keys
 
-# Wait till the query is finished
-query_job_result = query_job.result()
+    credentials = service_account.Credentials.from_service_account_file(gc_keys)
+    project_id = credentials.project_id
+    client = bigquery.Client(credentials=credentials, project=project_id)
 
-# Remove the temporary table
-try:
-    client.delete_table(temp_table_id)
-    print("Tijdelijke tabel succesvol verwijderd.")
-except Exception as e:
-    print(f"Fout bij het verwijderen van de tijdelijke tabel: {e}")
\ No newline at end of file
+    # Upsert the sales lines: only new or changed lines are written
+    # The table stores dates as 'YYYY-MM-DD' text and a missing THT date as ''
+    staging_dir = os.getenv("STAGING_PATH", "staging")
+    upsert_frame(client, merged_df, SALES_LINES_SCHEMA, full_table_id, SALES_LINE_KEYS, staging_dir,
+                 update_columns=SALES_LINE_UPDATES, date_columns=('Besteldatum', 'Verzenddatum', 'THT_Datum'), blank_columns=('THT_Datum',))
@@ -0,0 +1,91 @@
+import json
+import os
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+# Products with their EAN's, description variants and bulk SKU's
+PRODUCTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'products.json')
+
+# Format of products.json that this module understands
+DATA_VERSION = 1
+
+def normalise_keys(values: pd.Series) -> pd.Series:
+    # One spelling per key: 8719326399355.0 is the EAN 8719326399355, '4X' is '4x' and extra spaces don't count
+    if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+        values = values.astype('Int64')
+    elif values.dtype == object:
+        values = values.map(lambda value: int(value) if isinstance(value, float) and value.is_integer() else value)
+    values = values.astype('string').str.strip().str.replace(r'\s+', ' ', regex=True).str.casefold()
+    # The same for an EAN that was written out as text from a float column
+    return values.str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+
+class ProductDimension:
+    def __init__(self, products: list[dict], version: int):
+        self.version = version
+        self.products = pd.DataFrame(
+            [{'id': product['id'], 'name': product['name'], 'sheet': product.get('sheet')} for product in products]
+        ).set_index('id')
+
+        # Every EAN, name, description variant and bulk SKU points to the position of its product
+        keys = []
+        positions = []
+        for position, product in enumerate(products):
+            variants = product.get('eans', []) + [product['name']] + product.get('descriptions', []) + product.get('bulk_skus', [])
+            keys.extend(variants)
+            positions.extend([position] * len(variants))
+
+        index = pd.DataFrame({'key': normalise_keys(pd.Series(keys, dtype='string')), 'position': positions}).drop_duplicates()
+        conflicts = index[index['key'].duplicated(keep=False)]
+        if not conflicts.empty:
+            raise ValueError(f"Sleutels horen bij meer dan één product: {sorted(conflicts['key'].unique())}")
+
+        self._keys = pd.Index(index['key'])
+        self._positions = index['position'].to_numpy()
+
+    @classmethod
+    def load(cls, path: str = PRODUCTS_PATH) -> 'ProductDimension':
+        with open(path, 'r') as file:
+            data = json.load(file)
+        if data.get('version') != DATA_VERSION:
+            raise ValueError(f"{path} heeft versie {data.get('version')}, verwacht versie {DATA_VERSION}")
+        return cls(data['products'], data['version'])
+
+    def codes(self, values: pd.Series) -> np.ndarray:
+        # Position of the product for every value, -1 when nothing matches
+        # Every distinct value is normalised and looked up once, the rows only get the resulting code
+        value_codes, uniques = pd.factorize(values)
+        if len(uniques) == 0:
+            return np.full(len(values), -1)
+        found = self._keys.get_indexer(normalise_keys(pd.Series(uniques)))
+        unique_codes = np.where(found >= 0, self._positions[np.maximum(found, 0)], -1)
+        return np.where(value_codes >= 0, unique_codes[value_codes], -1)
+
+    def lookup(self, values: pd.Series) -> pd.Categorical:
+        # Canonical product id for a whole column, missing where the value is unknown
+        return pd.Categorical.from_codes(self.codes(values), categories=self.products.index)
+
+    def attribute(self, values: pd.Series, column: str) -> pd.Series:
+        codes = self.codes(values)
+        result = self.products[column].to_numpy()[np.maximum(codes, 0)]
+        return pd.Series(np.where(codes >= 0, result, None), index=values.index, dtype=object)
+
+    def name(self, values: pd.Series) -> pd.Series:
+        return self.attribute(values, 'name')
+
+    def sheet(self, values: pd.Series) -> pd.Series:
+        return self.attribute(values, 'sheet')
+
+    def unmatched(self, values: pd.Series) -> pd.Series:
+        # Values without a product and how often they occur, to extend products.json with
+        missing = values[(self.codes(values) < 0) & values.notna()]
+        return missing.value_counts()
+
+_product_dimension: Optional[ProductDimension] = None
+
+def get_product_dimension() -> ProductDimension:
+    # Loaded once per process, on first use
+    global _product_dimension
+    if _product_dimension is None:
+        _product_dimension = ProductDimension.load(os.getenv("PRODUCTS_PATH", PRODUCTS_PATH))
+    return _product_dimension
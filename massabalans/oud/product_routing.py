@@ -0,0 +1,20 @@
+import pandas as pd
+from product_dimension import get_product_dimension
+
+# Tabs in the Massabalans sheets, in the order they are written
+SHEET_NAMES = ['Probiotica', 'Kombucha', 'Bulk Kombucha', 'Waterkefir', 'Bulk Waterkefir', 'Mix', 'Bloem', 'Bulk Bloem',
+               'Citroen', 'Bulk Citroen', 'Gember', 'Bulk Gember', 'Frisdrank', 'Starter Box']
+
+def split_by_sheet(df_agg: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    # Label every row with its sheet once and partition the frame in a single categorical groupby
+    # The SKU (EAN or bulk SKU) decides, the description only when the SKU is unknown
+    # Every sheet gets a frame, also when it is empty, so old data on that tab is still cleared
+    products = get_product_dimension()
+    sheet = products.sheet(df_agg['SKU']).fillna(products.sheet(df_agg['Omschrijving']))
+    sheet = pd.Categorical(sheet, categories=SHEET_NAMES)
+
+    positions = df_agg.groupby(sheet, observed=True, sort=False).indices
+    return {
+        sheet_name: df_agg.iloc[positions[sheet_name]] if sheet_name in positions else df_agg.iloc[0:0]
+        for sheet_name in SHEET_NAMES
+    }
@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import requests
+from rate_limit import backoff_delay
+
+# Bytes that are written to disk at a time, the report itself is never held in memory
+CHUNK_SIZE = 1024 * 1024
+
+def _total_size(response: requests.Response) -> Optional[int]:
+    # Full size of the file: the part after the slash of Content-Range, or Content-Length of a complete response
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and not content_range.endswith('/*'):
+        return int(content_range.rsplit('/', 1)[1])
+    if response.status_code == 200 and response.headers.get('Content-Length'):
+        return int(response.headers['Content-Length'])
+    return None
+
+def file_digest(path: str, algorithm: str = 'sha256') -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def download_report(monta_client, report_id: str, path: str, expected_sha256: Optional[str] = None, max_attempts: int = 5) -> Optional[str]:
+    # Stream the report to path.part and resume with a Range request when the connection drops
+    # The file only gets its real name once the size and checksum are right
+    endpoint = f"reports/{report_id}/file"
+    part_path = f"{path}.part"
+    total_size = None
+    content_md5 = None
+
+    for attempt in range(max_attempts):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        # Byte offsets only make sense on the file itself, not on a compressed body
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+
+        try:
+            response = monta_client.get(endpoint, stream=True, headers=headers)
+        except requests.RequestException as e:
+            # The client already retried, give up on this report but not on the others
+            print(f"Failed to fetch report {report_id}: {e}")
+            return None
+        try:
+            if response.status_code == 416 and offset:
+                total_size = _total_size(response)
+                # Nothing left to send: the part file from an earlier attempt is already complete
+                if offset == total_size:
+                    break
+                # The part file is larger than the report or its size is unknown, so it can't be resumed
+                print(f"Report {report_id} can't be resumed at byte {offset} of {total_size}, removing {part_path} and starting over")
+                os.remove(part_path)
+                total_size = None
+                content_md5 = None
+                continue
+            if response.status_code not in (200, 206):
+                print(f"Failed to fetch report {report_id}: {response.status_code} - {response.text}")
+                return None
+
+            # A 200 means the server ignored the Range header and sends the file from the start
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            total_size = _total_size(response) or total_size
+            # Content-MD5 of a 206 only covers the part in its body, so it is only taken from a complete response
+            # Resumed files are checked on their size and expected_sha256
+            if response.status_code == 200:
+                content_md5 = response.headers.get('Content-MD5')
+            with open(part_path, mode) as file:
+                for block in response.iter_content(CHUNK_SIZE):
+                    file.write(block)
+
+            if total_size is None or os.path.getsize(part_path) >= total_size:
+                break
+            print(f"Report {report_id} stopped at {os.path.getsize(part_path)} of {total_size} bytes, resuming")
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            delay = backoff_delay(attempt)
+            print(f"Download of report {report_id} interrupted ({e}), resuming in {delay:.1f}s")
+            time.sleep(delay)
+        finally:
+            response.close()
+    else:
+        print(f"Failed to download report {report_id} after {max_attempts} attempts, {part_path} is kept to resume later")
+        return None
+
+    size = os.path.getsize(part_path)
+    if total_size is not None and size != total_size:
+        print(f"Report {report_id} has {size} bytes instead of {total_size}")
+        return None
+    if content_md5 and base64.b64encode(bytes.fromhex(file_digest(part_path, 'md5'))).decode() != content_md5:
+        print(f"Report {report_id} does not match its Content-MD5, removing {part_path}")
+        os.remove(part_path)
+        return None
+    if expected_sha256 and file_digest(part_path) != expected_sha256.lower():
+        print(f"Report {report_id} does not match its checksum, removing {part_path}")
+        os.remove(part_path)
+        return None
+
+    os.replace(part_path, path)
+    print(f"Report {report_id} has been saved to '{path}' ({size} bytes).")
+    return path
+
+def download_reports(monta_client, report_details: list[dict], folder: str, max_workers: int = 4) -> dict[str, Optional[str]]:
+    # Download several reports at the same time, every report streams to its own file
+    os.makedirs(folder, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            report['Id']: executor.submit(download_report, monta_client, report['Id'], os.path.join(folder, f"report_{report['Id']}.csv"))
+            for report in report_details
+        }
+        return {report_id: future.result() for report_id, future in futures.items()}
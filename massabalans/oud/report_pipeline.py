@@ -0,0 +1,238 @@
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+import pandas as pd
+import pyarrow as pa
+from dotenv import load_dotenv
+from excel_dates import excel_to_date
+from xlsx_reader import read_xlsx_report
+from dedup import collapse_duplicates
+from product_dimension import get_product_dimension
+from product_routing import split_by_sheet
+from sheet_sync import sync_sheets
+from arrow_staging import SALES_LINES_SCHEMA, SALES_LINE_KEYS, SALES_LINE_UPDATES
+from bq_upsert import replace_frame, upsert_frame
+from run_metrics import get_run_metrics
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+from google.oauth2 import service_account
+from google.cloud import bigquery
+
+# Load .env
+load_dotenv()
+
+@dataclass(frozen=True)
+class ReportSpec:
+    # Monta reports are files named '<prefix> YYYY-MM-DD.xlsx'
+    file_prefix: str
+    # Columns to keep, mapped to their name in the output
+    columns: dict[str, str]
+    date_columns: tuple[str, ...] = ()
+    # Output rows are summed per group_keys, or lines with the same keys are collapsed when there are none
+    group_keys: tuple[str, ...] = ()
+    value: str = 'Aantal'
+    # Only keep rows where this column contains this text
+    row_filter: Optional[tuple[str, str]] = None
+    # Add the product name from products.json as Omschrijving, for reports that only have a SKU
+    add_product_name: bool = False
+    # 'sheets' writes one tab per product to the spreadsheet target, 'bigquery' upserts the rows into the table target
+    # and 'bigquery_replace' replaces the whole table with them
+    sink: str = 'sheets'
+    target: str = ''
+    # BigQuery sinks: the staged schema, the MERGE key and the columns a later report may change (None for all others)
+    schema: Optional[pa.Schema] = None
+    keys: tuple[str, ...] = ()
+    update_columns: Optional[tuple[str, ...]] = None
+    # Date columns that store a missing date as '' instead of NULL
+    blank_columns: tuple[str, ...] = ()
+
+REPORT_SPECS = {
+    'inbound': ReportSpec(
+        file_prefix='Inbound',
+        columns={'SKU': 'SKU', 'Qty': 'Aantal', 'Inbound date': 'InboundDate', 'Batch': 'Batch', 'BatchBestBeforeDate': 'THT_Datum'},
+        date_columns=('InboundDate', 'THT_Datum'),
+        group_keys=('SKU', 'Batch'),
+        add_product_name=True,
+        target='Massabalans Inbound Monta',
+    ),
+    'sales': ReportSpec(
+        file_prefix='Sales',
+        columns={'OrderNummer': 'OrderNummer', 'Besteldatum': 'Besteldatum', 'Verzenddatum': 'Verzenddatum', 'SKU': 'SKU',
+                 'Omschrijving': 'Omschrijving', 'Aantal': 'Aantal', 'Batch': 'Batch', 'THT Datum': 'THT_Datum', 'Orderstatus': 'Orderstatus'},
+        date_columns=('Besteldatum', 'Verzenddatum', 'THT_Datum'),
+        group_keys=('SKU', 'Omschrijving', 'Batch'),
+        target='Massabalans Verkoop Monta',
+    ),
+    'returns': ReportSpec(
+        file_prefix='Returns',
+        columns={'Description': 'Omschrijving', 'ReturnDate': 'ReturnDate', 'SKU': 'SKU', 'Qty': 'Aantal', 'LOT nr': 'Batch',
+                 'WebshopOrderID': 'WebshopOrderID', 'Sellable': 'Sellable', 'Return cause': 'Return cause'},
+        date_columns=('ReturnDate',),
+        group_keys=('SKU', 'Omschrijving', 'Batch', 'Sellable'),
+        # Only sellable returns go back into stock
+        row_filter=('Sellable', 'Opgeboekt bij voorraad: Verkoopbaar'),
+        target='Massabalans Return Monta ',
+    ),
+    'sales_lines': ReportSpec(
+        file_prefix='verzonden_en_queued_orders',
+        columns={'OrderNummer': 'OrderNummer', 'Besteldatum': 'Besteldatum', 'Verzenddatum': 'Verzenddatum', 'SKU': 'SKU',
+                 'Omschrijving': 'Omschrijving', 'Aantal': 'Aantal', 'Batch': 'Batch', 'THT Datum': 'THT_Datum', 'Orderstatus': 'Orderstatus'},
+        date_columns=('Besteldatum', 'Verzenddatum', 'THT_Datum'),
+        sink='bigquery',
+        target=f'{os.getenv("MONTA_PROJECT_ID", "")}.{os.getenv("MONTA_DATASET_ID", "")}.{os.getenv("MONTA_TABLE_ID", "")}',
+        # The table stores dates as 'YYYY-MM-DD' text and a missing THT date as ''
+        schema=SALES_LINES_SCHEMA,
+        keys=tuple(SALES_LINE_KEYS),
+        update_columns=tuple(SALES_LINE_UPDATES),
+        blank_columns=('THT_Datum',),
+    ),
+}
+
+def report_date(path: str) -> Optional[str]:
+    match = re.search(r'\d{4}-\d{2}-\d{2}', os.path.basename(path))
+    return match.group() if match else None
+
+def aggregate(spec: ReportSpec, df: pd.DataFrame) -> pd.DataFrame:
+    # Sum per group, also for frames that were aggregated before, so results of several files can be combined
+    # Without group_keys lines are collapsed on the key of the MERGE, so every line matches at most one row in the warehouse
+    if not spec.group_keys:
+        return collapse_duplicates(df, list(spec.keys), spec.value) if spec.keys else df
+    keys = list(spec.group_keys)
+    df = df.assign(**{key: df[key].fillna('') for key in keys})
+    return df.groupby(keys, sort=True)[spec.value].sum().reset_index()
+
+def parse_report(spec: ReportSpec, path: str) -> tuple[pd.DataFrame, dict[str, float]]:
+    # Everything that only needs the file, so it can run in a worker process
+    timings = {}
+
+    start = time.perf_counter()
+    df = read_xlsx_report(path)
+    timings['xlsx_parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = df[list(spec.columns)].rename(columns=spec.columns)
+    # Zet de Excel datums per kolom in één keer om
+    for column in spec.date_columns:
+        df[column] = excel_to_date(df[column])
+    timings['date_conversion'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df[spec.value] = pd.to_numeric(df[spec.value], errors='coerce')
+    if spec.row_filter:
+        column, text = spec.row_filter
+        df = df[df[column].str.contains(text, na=False)]
+    timings['transform'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = aggregate(spec, df)
+    timings['aggregation'] = time.perf_counter() - start
+
+    return df, timings
+
+def _open_spreadsheet(title: str):
+    # Initialize Google Sheets connection
+    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+    gc_keys = os.getenv('AARDG_GOOGLE_CREDENTIALS', '')
+    creds = ServiceAccountCredentials.from_json_keyfile_name(gc_keys, scope)
+    return gspread.authorize(creds).open(title)
+
+def write_sheets(spec: ReportSpec, df: pd.DataFrame) -> None:
+    # Write all dataframes to the sheet in one batch, only changed rows when a snapshot is kept
+    with get_run_metrics().stage('sheets_write', report=spec.file_prefix, rows=len(df)):
+        sync_sheets(_open_spreadsheet(spec.target), split_by_sheet(df), os.getenv('SHEETS_SNAPSHOT_PATH'))
+    print("Dataframes zijn succesvol geüpload naar Google Sheets!")
+
+def _bigquery_client() -> bigquery.Client:
+    # Get the GCP keys
+    gc_keys = os.getenv("AARDG_GOOGLE_CREDENTIALS")
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gc_keys
+    credentials = service_account.Credentials.from_service_account_file(gc_keys)
+    return bigquery.Client(credentials=credentials, project=credentials.project_id)
+
+def write_bigquery(spec: ReportSpec, df: pd.DataFrame) -> None:
+    staging_dir = os.getenv("STAGING_PATH", "staging")
+    update_columns = list(spec.update_columns) if spec.update_columns is not None else None
+    upsert_frame(_bigquery_client(), df, spec.schema, spec.target, list(spec.keys), staging_dir,
+                 update_columns=update_columns, date_columns=spec.date_columns, blank_columns=spec.blank_columns)
+
+def write_bigquery_replace(spec: ReportSpec, df: pd.DataFrame) -> None:
+    # Like write_bigquery, but rows that are no longer in the report are removed from the table as well
+    staging_dir = os.getenv("STAGING_PATH", "staging")
+    replace_frame(_bigquery_client(), df, spec.schema, spec.target, staging_dir,
+                  date_columns=spec.date_columns, blank_columns=spec.blank_columns)
+
+SINKS = {'sheets': write_sheets, 'bigquery': write_bigquery, 'bigquery_replace': write_bigquery_replace}
+
+def parse_reports(spec: ReportSpec, paths: list[str], max_workers: Optional[int] = None) -> tuple[list[pd.DataFrame], dict[str, float]]:
+    # Parse every file in its own process
+    timings = {'xlsx_parse': 0.0, 'date_conversion': 0.0, 'transform': 0.0, 'aggregation': 0.0}
+    start = time.perf_counter()
+    if len(paths) == 1:
+        results = [parse_report(spec, paths[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(parse_report, [spec] * len(paths), paths))
+    timings['parse'] = time.perf_counter() - start
+
+    # Stage times are summed over all files, parse is the wall time of all of them together
+    # The workers can't reach the run metrics, so their stage times are recorded here per file
+    metrics = get_run_metrics()
+    for path, (df, file_timings) in zip(paths, results):
+        for stage, seconds in file_timings.items():
+            timings[stage] += seconds
+            metrics.record(stage, seconds, file=os.path.basename(path), output_rows=len(df))
+    metrics.record('parse', timings['parse'], report=spec.file_prefix, files=len(paths))
+    return [df for df, _ in results], timings
+
+def write_report(spec: ReportSpec, frames: list[pd.DataFrame], timings: dict[str, float]) -> pd.DataFrame:
+    # Combine the parsed files and write them with one upload
+    start = time.perf_counter()
+    df = frames[0] if len(frames) == 1 else aggregate(spec, pd.concat(frames, ignore_index=True))
+    if spec.add_product_name:
+        df = df.assign(Omschrijving=get_product_dimension().name(df['SKU']).fillna(''))
+    # SKU's that are not in products.json yet get no name, and no tab when the description is unknown as well
+    if spec.add_product_name or spec.sink == 'sheets':
+        unmatched = get_product_dimension().unmatched(df['SKU'])
+        if not unmatched.empty:
+            print(f"Onbekende SKU's: {unmatched.to_dict()}")
+    timings['combine'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    SINKS[spec.sink](spec, df)
+    timings['write'] = time.perf_counter() - start
+
+    print(f"{spec.file_prefix}: {len(frames)} bestand(en), {len(df)} rijen, " + ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    return df
+
+def run_report(spec: ReportSpec, paths: list[str], max_workers: Optional[int] = None) -> tuple[pd.DataFrame, dict[str, float]]:
+    frames, timings = parse_reports(spec, paths, max_workers)
+    return write_report(spec, frames, timings), timings
+
+def report_pattern(spec: ReportSpec) -> re.Pattern:
+    # '<prefix> YYYY-MM-DD.xlsx' or '<prefix>_YYYY-MM-DD.xlsx'
+    return re.compile(rf'^{re.escape(spec.file_prefix)}[ _]\d{{4}}-\d{{2}}-\d{{2}}\.xlsx$')
+
+def find_reports(spec: ReportSpec, folder: str) -> list[str]:
+    # All reports of this type in folder, oldest first
+    pattern = report_pattern(spec)
+    names = sorted((name for name in os.listdir(folder or '.') if pattern.match(name)), key=report_date)
+    return [os.path.join(folder, name) for name in names]
+
+def latest_report(spec: ReportSpec, folder: str) -> Optional[str]:
+    paths = find_reports(spec, folder)
+    return paths[-1] if paths else None
+
+if __name__ == "__main__":
+    # python report_pipeline.py <report> [files...], without files the most recent report in CSV_MAIN_PATH is used
+    report_name = sys.argv[1]
+    spec = REPORT_SPECS[report_name]
+    report_folder = os.getenv("CSV_MAIN_PATH", "")
+    paths = sys.argv[2:] or [latest_report(spec, report_folder)]
+    if paths == [None]:
+        print(f"Geen {spec.file_prefix} rapport gevonden in {report_folder or '.'}")
+    else:
+        run_report(spec, paths)
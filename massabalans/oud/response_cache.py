@@ -0,0 +1,159 @@
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Seconds a cached response stays fresh, per endpoint pattern
+# Endpoints that match none of the patterns are never cached
+DEFAULT_TTLS = [
+    (r'^order/[^/?]+/batches$', 30 * 24 * 3600),
+    (r'^order/[^/?]+$', 7 * 24 * 3600),
+]
+
+# An order and its batch lines only stop changing once the order has shipped, before that they are not stored
+ORDER_ENDPOINT = re.compile(r'^order/([^/?]+)$')
+BATCHES_ENDPOINT = re.compile(r'^order/([^/?]+)/batches$')
+
+# Batch lines that arrived before their order, kept in memory until the order shows whether it has shipped
+MAX_PENDING = 1000
+
+def _has_shipped(response: requests.Response) -> bool:
+    try:
+        return bool(response.json().get('Shipped'))
+    except ValueError:
+        return False
+
+class ResponseCache:
+    # Persistent SQLite cache for Monta GET responses with LRU eviction on total size
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, ttls: list = DEFAULT_TTLS):
+        self.max_bytes = max_bytes
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.pending: dict[str, tuple[str, requests.Response]] = {}
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                endpoint TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def ttl_for(self, endpoint: str) -> Optional[int]:
+        for pattern, ttl in self.ttls:
+            if pattern.search(endpoint):
+                return ttl
+        return None
+
+    def lookup(self, endpoint: str) -> Optional[dict]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body, content_type, etag, last_modified, stored_at FROM responses WHERE endpoint = ?",
+                (endpoint,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE responses SET accessed_at = ? WHERE endpoint = ?", (time.time(), endpoint))
+            self.connection.commit()
+        body, content_type, etag, last_modified, stored_at = row
+        return {
+            'body': zlib.decompress(body),
+            'content_type': content_type,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fresh': time.time() - stored_at < self.ttl_for(endpoint),
+        }
+
+    def store(self, endpoint: str, response: requests.Response) -> None:
+        # Orders are only stored once they have shipped, their batch lines together with them or after them
+        with self.lock:
+            batches = BATCHES_ENDPOINT.match(endpoint)
+            if batches and not self._has(f"order/{batches.group(1)}"):
+                if len(self.pending) >= MAX_PENDING:
+                    self.pending.pop(next(iter(self.pending)))
+                self.pending[batches.group(1)] = (endpoint, response)
+                return
+
+            order = ORDER_ENDPOINT.match(endpoint)
+            if order:
+                pending = self.pending.pop(order.group(1), None)
+                if not _has_shipped(response):
+                    return
+                self._write(endpoint, response)
+                if pending:
+                    self._write(*pending)
+            else:
+                self._write(endpoint, response)
+            self._evict()
+            self.connection.commit()
+
+    def _has(self, endpoint: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM responses WHERE endpoint = ?", (endpoint,)).fetchone() is not None
+
+    def _write(self, endpoint: str, response: requests.Response) -> None:
+        body = zlib.compress(response.content)
+        now = time.time()
+        old = self.connection.execute("SELECT size FROM responses WHERE endpoint = ?", (endpoint,)).fetchone()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (endpoint, body, response.headers.get('Content-Type'), response.headers.get('ETag'),
+             response.headers.get('Last-Modified'), now, now, len(body)),
+        )
+        self.total_bytes += len(body) - (old[0] if old else 0)
+
+    def refresh(self, endpoint: str) -> None:
+        # The server confirmed the cached copy is still valid (304)
+        now = time.time()
+        with self.lock:
+            self.connection.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE endpoint = ?", (now, now, endpoint))
+            self.connection.commit()
+
+    def _evict(self) -> None:
+        # Drop the least recently used responses until the cache fits again
+        while self.total_bytes > self.max_bytes:
+            rows = self.connection.execute("SELECT endpoint, size FROM responses ORDER BY accessed_at LIMIT 100").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for endpoint, size in rows:
+                self.connection.execute("DELETE FROM responses WHERE endpoint = ?", (endpoint,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    return
+
+    def to_response(self, entry: dict, url: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = entry['body']
+        response.headers = CaseInsensitiveDict({'Content-Type': entry['content_type'] or 'application/json'})
+        response.encoding = 'utf-8'
+        return response
+
+    def count(self, kind: str) -> None:
+        # kind is 'hits', 'misses' or 'revalidated'
+        with self.lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+
+    def report(self) -> str:
+        return (f"Cache: {self.hits} hits, {self.revalidated} revalidated, {self.misses} misses, "
+                f"{self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def close(self) -> None:
+        self.connection.close()
@@ -1,26 +1,22 @@
-import requests
-from requests.auth import HTTPBasicAuth
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
-from typing import List, Optional
+from typing import Iterator, List, Optional
+from monta_client import get_monta_client
+from run_metrics import get_run_metrics
 
 # Import keys.env
 load_dotenv()
 
 # Define variables
-api_url: str = os.getenv("MONTA_API_URL", "")
-username: str = os.getenv("MONTA_USERNAME", "")
-password: str = os.getenv("MONTA_PASSWORD", "")
-
-if api_url is None or username is None or password is None:
-    raise ValueError("API URL, username, or password environment variables are not set.")
+monta_client = get_monta_client()
 
 def retrieve_order_ids(created_since: str, created_until: str, page: int, page_size: int = 30) -> Optional[list[dict]]:
     endpoint = f"orders?created_since={created_since}&created_until={created_until}&page={page}&page_size={page_size}"
-    full_url = api_url + endpoint
-    response = requests.get(full_url, auth=HTTPBasicAuth(username, password))
+    response = monta_client.get(endpoint)
     
     if response.status_code == 200:
         order_data = response.json()
@@ -38,28 +34,49 @@ def extract_order_ids(order_data: list[dict]) -> List[str]:
     
     return order_ids
 
+def iter_order_pages(created_since: str, created_until: str, page_size: int = 30, prefetch: int = 4) -> Iterator[list[dict]]:
+    # Keep `prefetch` pages in flight and yield them in page order
+    # Stops at the first empty, short or failed page
+    executor = ThreadPoolExecutor(max_workers=prefetch)
+    pending = deque()
+    next_page = 0
+    try:
+        for _ in range(prefetch):
+            pending.append(executor.submit(retrieve_order_ids, created_since, created_until, next_page, page_size))
+            next_page += 1
+
+        while pending:
+            data = pending.popleft().result()
+            if not data:
+                break
+            yield data
+            if len(data) < page_size:
+                break
+            pending.append(executor.submit(retrieve_order_ids, created_since, created_until, next_page, page_size))
+            next_page += 1
+    finally:
+        # Pages beyond the last one are not needed anymore
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_order_ids(created_since: str, created_until: str, page_size: int = 30, max_orders: int = 10000, prefetch: int = 4) -> Iterator[str]:
+    # Stream order ids as soon as their page arrives
+    count = 0
+    for data in iter_order_pages(created_since, created_until, page_size, prefetch):
+        for order_id in extract_order_ids(data):
+            if count >= max_orders:
+                return
+            yield order_id
+            count += 1
+
 if __name__ == "__main__":
 
     created_since = '2023-01-01'
     created_until = '2023-01-02'
     page_size = 30  # Maximum page size
     max_orders = 10000
-    all_order_ids = []
-
-    page = 0
-    while len(all_order_ids) < max_orders:
-        data = retrieve_order_ids(created_since, created_until, page, page_size)
-        if data:
-            order_ids = extract_order_ids(data)
-            if not order_ids:
-                break
-            all_order_ids.extend(order_ids)
-            if len(order_ids) < page_size:
-                break
-            page += 1
-        else:
-            break
 
-    all_order_ids = all_order_ids[:max_orders]
+    with get_run_metrics().stage('order_id_fetch', page_size=page_size) as stage:
+        all_order_ids = list(iter_order_ids(created_since, created_until, page_size, max_orders))
+        stage['rows'] = len(all_order_ids)
     print(f"Total orders retrieved: {len(all_order_ids)}")
     print(all_order_ids)
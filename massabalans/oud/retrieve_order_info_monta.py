@@ -1,44 +1,46 @@
-import requests
-from requests.auth import HTTPBasicAuth
 import pandas as pd
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import bigquery
 from google.api_core.exceptions import BadRequest
 import os
-import pandas_gbq
-from retrieve_order_ids_monta import retrieve_order_ids, extract_order_ids
+from datetime import datetime, timedelta
+from retrieve_order_ids_monta import iter_order_ids, iter_order_pages
 from dotenv import load_dotenv
 import os
 from google.oauth2 import service_account
+from monta_client import get_monta_client
+from checkpoint_store import CheckpointStore
+from arrow_staging import ORDER_ROWS_SCHEMA, ORDER_ROW_KEYS
+from bq_upsert import upsert_frame
+from product_dimension import get_product_dimension
+from run_metrics import get_run_metrics
 
 # Import keys.env
 load_dotenv()
 
 # Define variables
-api_url = os.getenv("MONTA_API_URL")
-username = os.getenv("MONTA_USERNAME")
-password = os.getenv("MONTA_PASSWORD")
-
-# Product dictionary
-sku_to_product_name = {
-    '8719326399355': 'Citroen Kombucha 12x 250ml',
-    '8719326399362': 'Bloem Kombucha 12x 250ml',
-    '8719326399379': 'Gember Limonade 12x 250ml',
-    '8719326399386': 'Kombucha Original 4x 1L',
-    '8719326399393': 'Waterkefir Original 4x 1L',
-    '8719327215111': 'Starter Box',
-    '8719327215128': 'Frisdrank Mix 12x 250ml',
-    '8719327215135': 'Mix Originals 4x 1L',
-    '8719327215159': 'EAN 30 dagen challenge kalender',
-    '8719327215166': 'EAN Moederdag Kaart',
-    '8719327215173': 'Magnetische Flesopener voor Koelkast',
-    '8719327215180': 'Probiotica Ampullen 28x 9ml',
-    '8719327215197': 'Verjaardagskalender'
-}
+monta_client = get_monta_client()
+
+# Number of orders that are enriched at the same time
+max_workers = int(os.getenv("MONTA_MAX_WORKERS", "16"))
+
+# Number of rows per BigQuery upload and the size of the queues between pipeline stages
+chunk_size = int(os.getenv("MONTA_CHUNK_SIZE", "1000"))
+queue_size = int(os.getenv("MONTA_QUEUE_SIZE", "500"))
+
+# An order that has not shipped may still get its batch lines, after this many days it counts as final (cancelled)
+settle_days = int(os.getenv("MONTA_SETTLE_DAYS", "14"))
+
+# High-water mark of the incremental order sync
+checkpoint_store = CheckpointStore(os.getenv("MONTA_CHECKPOINT_PATH", "monta_checkpoint.json"))
+checkpoint_name = 'monta_orders'
 
 def retrieve_order_data(order_id):
     endpoint = f"order/{order_id}"
-    full_url = api_url + endpoint
-    response = requests.get(full_url, auth=HTTPBasicAuth(username, password))
+    response = monta_client.get(endpoint)
     
     if response.status_code == 200:
         return response.json()
@@ -48,8 +50,7 @@ def retrieve_order_data(order_id):
 
 def retrieve_order_batches(order_id):
     endpoint = f"order/{order_id}/batches"
-    full_url = api_url + endpoint
-    response = requests.get(full_url, auth=HTTPBasicAuth(username, password))
+    response = monta_client.get(endpoint)
     
     if response.status_code == 200:
         return response.json()
@@ -57,45 +58,88 @@ def retrieve_order_batches(order_id):
         print(f"Failed to retrieve batches for order {order_id}: {response.status_code}")
         return None
 
-def create_order_dataframe(order_ids):
+def fetch_order_details(order_ids, max_workers: int = max_workers):
+    # Retrieve the order and its batches at the same time and keep max_workers orders in flight
+    # Results are yielded as (order_id, order, batches) in the same order as order_ids
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=max_workers * 2) as executor:
+        for order_id in order_ids:
+            in_flight.append((
+                order_id,
+                executor.submit(retrieve_order_data, order_id),
+                executor.submit(retrieve_order_batches, order_id),
+            ))
+            if len(in_flight) >= max_workers:
+                order_id, order_future, batches_future = in_flight.popleft()
+                yield order_id, order_future.result(), batches_future.result()
+
+        while in_flight:
+            order_id, order_future, batches_future = in_flight.popleft()
+            yield order_id, order_future.result(), batches_future.result()
+
+def create_batch_rows(order, batches):
+    # product_name is filled in per chunk by add_product_names
+    rows = []
+    for batch in batches['BatchLines']:
+        sku = batch['Sku']
+        batch_info = {
+            'order_id': order['WebshopOrderId'],
+            'first_name': order['ConsumerDetails']['DeliveryAddress']['FirstName'],
+            'last_name': order['ConsumerDetails']['DeliveryAddress']['LastName'],
+            'email': order['ConsumerDetails']['DeliveryAddress']['EmailAddress'],
+            'street': order['ConsumerDetails']['DeliveryAddress']['Street'],
+            'house_number': order['ConsumerDetails']['DeliveryAddress']['HouseNumber'],
+            'house_number_addition': order['ConsumerDetails']['DeliveryAddress']['HouseNumberAddition'],
+            'postal_code': order['ConsumerDetails']['DeliveryAddress']['PostalCode'],
+            'city': order['ConsumerDetails']['DeliveryAddress']['City'],
+            'country': order['ConsumerDetails']['DeliveryAddress']['CountryCode'],
+            'ordered': order['Received'],
+            'shipped': order.get('Shipped'),
+            'sku': sku,
+            'quantity': abs(batch['Quantity']),
+            'batch_title': batch['BatchContent']['Title'] if batch.get('BatchContent') else None,
+            'batch_bestbeforedate': batch['BatchContent']['BestBefore'] if batch.get('BatchContent') else None,
+            'product_name': None
+        }
+        rows.append(batch_info)
+    return rows
+
+def add_product_names(df: pd.DataFrame) -> pd.DataFrame:
+    # Look up the product of every row in one go and keep only rows of known products
+    if df.empty:
+        return df
+    products = get_product_dimension()
+    df = df.assign(product_name=products.name(df['sku']))
+    return df[df['product_name'].notna()].reset_index(drop=True)
+
+def create_order_dataframe(order_ids, max_workers: int = max_workers):
     order_data = []
+    failed_order_ids = []
     
-    for idx, order_id in enumerate(order_ids):
-        print(f"Processing order {idx+1} of {len(order_ids)}")
-        order = retrieve_order_data(order_id)
-        if order:
-            batches = retrieve_order_batches(order_id)
-            if batches:
-                for batch in batches['BatchLines']:
-                    sku = batch['Sku']
-                    product_name = sku_to_product_name.get(sku, 'Unknown')
-                    if product_name != 'Unknown':
-                        batch_info = {
-                            'order_id': order['WebshopOrderId'],
-                            'first_name': order['ConsumerDetails']['DeliveryAddress']['FirstName'],
-                            'last_name': order['ConsumerDetails']['DeliveryAddress']['LastName'],
-                            'email': order['ConsumerDetails']['DeliveryAddress']['EmailAddress'],
-                            'street': order['ConsumerDetails']['DeliveryAddress']['Street'],
-                            'house_number': order['ConsumerDetails']['DeliveryAddress']['HouseNumber'],
-                            'house_number_addition': order['ConsumerDetails']['DeliveryAddress']['HouseNumberAddition'],
-                            'postal_code': order['ConsumerDetails']['DeliveryAddress']['PostalCode'],
-                            'city': order['ConsumerDetails']['DeliveryAddress']['City'],
-                            'country': order['ConsumerDetails']['DeliveryAddress']['CountryCode'],
-                            'ordered': order['Received'],
-                            'shipped': order.get('Shipped'),
-                            'sku': sku,
-                            'quantity': abs(batch['Quantity']),
-                            'batch_title': batch['BatchContent']['Title'] if batch.get('BatchContent') else None,
-                            'batch_bestbeforedate': batch['BatchContent']['BestBefore'] if batch.get('BatchContent') else None,
-                            'product_name': product_name
-                        }
-                        order_data.append(batch_info)
+    # order_ids may be a generator that is still paging through Monta
+    total = len(order_ids) if hasattr(order_ids, '__len__') else '?'
+    details = fetch_order_details(order_ids, max_workers)
+    for idx, (order_id, order, batches) in enumerate(details):
+        print(f"Processing order {idx+1} of {total}")
+        if order and batches:
+            order_data.extend(create_batch_rows(order, batches))
+        else:
+            failed_order_ids.append(order_id)
     
-    df = pd.DataFrame(order_data)
+    if failed_order_ids:
+        print(f"{len(failed_order_ids)} orders could not be retrieved: {failed_order_ids}")
+    
+    df = add_product_names(pd.DataFrame(order_data))
     return df
 
 def transfer_data_to_bigquery(df):
 
+    # Only rows of known products are loaded
+    df = add_product_names(df)
+    if df.empty:
+        print("Geen orderregels om te uploaden.")
+        return
+
     # Define variables
     project_id = os.getenv("MONTA_PROJECT_ID")
     dataset_id = os.getenv("MONTA_DATASET_ID")
@@ -110,11 +154,173 @@ def transfer_data_to_bigquery(df):
     project_id = credentials.project_id
     client = bigquery.Client(credentials=credentials, project=project_id)
 
-    # Insert data into newly made table
-    pandas_gbq.to_gbq(df, full_table_id, project_id=project_id, if_exists='append')
+    # The same batch of a product can be split over several lines of one order, those count as one row
+    other_columns = [column for column in df.columns if column not in ORDER_ROW_KEYS + ['quantity']]
+    aggregations = {**{column: 'first' for column in other_columns}, 'quantity': 'sum'}
+    df = df.groupby(ORDER_ROW_KEYS, dropna=False, sort=False, as_index=False).agg(aggregations)
+
+    # Upsert instead of append, so orders that are fetched again don't end up in the table twice
+    staging_dir = os.getenv("STAGING_PATH", "staging")
+    upsert_frame(client, df, ORDER_ROWS_SCHEMA, full_table_id, ORDER_ROW_KEYS, staging_dir)
 
     print(f"Data is succesvol geüpload naar {full_table_id}.")
 
+# Marks the end of a pipeline queue
+_END = object()
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # Block on a full queue, but give up when the pipeline is stopping
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _drain(q: queue.Queue, stop: threading.Event):
+    # Yield items until the upstream stage is done, re-raising its errors
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+def _run_stage(source, q: queue.Queue, stop: threading.Event) -> None:
+    try:
+        for item in source:
+            if not _put(q, item, stop):
+                return
+        _put(q, _END, stop)
+    except Exception as e:
+        _put(q, e, stop)
+
+def is_settled(order: dict, settle_days: int = settle_days) -> bool:
+    # Shipped orders don't change anymore, unshipped ones only once they are older than settle_days
+    if order.get('Shipped'):
+        return True
+    received = datetime.fromisoformat(order['Received'][:19])
+    return received < datetime.now() - timedelta(days=settle_days)
+
+def _enrich_stage(id_queue: queue.Queue, stop: threading.Event, max_workers: int):
+    # (order_id, rows, settled) in the order of the ids, rows is None when the order could not be retrieved
+    for order_id, order, batches in fetch_order_details(_drain(id_queue, stop), max_workers):
+        if order and batches:
+            yield order_id, create_batch_rows(order, batches), is_settled(order)
+        else:
+            yield order_id, None, False
+
+def run_order_pipeline(order_ids, load_chunk, chunk_size: int = chunk_size, queue_size: int = queue_size,
+                       max_workers: int = max_workers, on_chunk_loaded=None) -> int:
+    # page -> enrich -> batch -> load, connected by bounded queues
+    # Chunks always contain whole orders and are handed to load_chunk as soon as they are full
+    # on_chunk_loaded is called after every chunk with the rows of the orders before the first failed or unsettled order
+    # of this run, so a checkpoint built from them never moves past an order that still has to be fetched
+    stop = threading.Event()
+    id_queue = queue.Queue(maxsize=queue_size)
+    rows_queue = queue.Queue(maxsize=queue_size)
+
+    stages = [
+        threading.Thread(target=_run_stage, args=(order_ids, id_queue, stop), daemon=True),
+        threading.Thread(target=_run_stage, args=(_enrich_stage(id_queue, stop, max_workers), rows_queue, stop), daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
+
+    chunk = []
+    # Rows at the start of the chunk that come before the first failed or unsettled order
+    complete_rows = 0
+    failed_order_ids = []
+    unsettled_order_ids = []
+    total_rows = 0
+    # Fetching and loading overlap, so this stage has all Monta requests and the bigquery_load stages run inside it
+    with get_run_metrics().stage('order_pipeline') as metrics_stage:
+        try:
+            for order_id, rows, settled in _drain(rows_queue, stop):
+                if rows is None:
+                    print(f"Order {order_id} could not be retrieved")
+                    failed_order_ids.append(order_id)
+                    continue
+                # The rows of an unshipped order are loaded, but it is fetched again until it has shipped
+                if not settled:
+                    unsettled_order_ids.append(order_id)
+                chunk.extend(rows)
+                if not failed_order_ids and not unsettled_order_ids:
+                    complete_rows = len(chunk)
+                if len(chunk) >= chunk_size:
+                    _load(pd.DataFrame(chunk), load_chunk, on_chunk_loaded, complete_rows)
+                    total_rows += len(chunk)
+                    print(f"{total_rows} rows loaded")
+                    chunk = []
+                    complete_rows = 0
+            if chunk:
+                _load(pd.DataFrame(chunk), load_chunk, on_chunk_loaded, complete_rows)
+                total_rows += len(chunk)
+                print(f"{total_rows} rows loaded")
+        finally:
+            stop.set()
+            for stage in stages:
+                stage.join()
+            metrics_stage['rows'] = total_rows
+            metrics_stage['failed_orders'] = len(failed_order_ids)
+            metrics_stage['unsettled_orders'] = len(unsettled_order_ids)
+
+    if failed_order_ids:
+        print(f"{len(failed_order_ids)} orders could not be retrieved: {failed_order_ids}")
+    if unsettled_order_ids:
+        print(f"{len(unsettled_order_ids)} orders have not shipped yet and are fetched again on the next run: {unsettled_order_ids}")
+    return total_rows
+
+def _load(df: pd.DataFrame, load_chunk, on_chunk_loaded, complete_rows: int) -> None:
+    load_chunk(df)
+    if on_chunk_loaded is not None and complete_rows:
+        on_chunk_loaded(df.iloc[:complete_rows])
+
+def _order_key(received, order_id) -> tuple:
+    # Numeric order ids compare as numbers, so order 10 comes after order 9, other ids compare as text
+    order_id = str(order_id)
+    if order_id.isdigit():
+        return (received or '', 0, int(order_id), '')
+    return (received or '', 1, 0, order_id)
+
+def iter_new_order_ids(checkpoint: dict, created_until: str, page_size: int = 30, max_orders: int = 10000):
+    # Yield only orders after the high-water mark
+    # Monta returns orders in order of creation, so everything after the mark is new
+    # The mark never passes an order that hasn't shipped yet, so orders of today are fetched again once they are picked
+    high_water_mark = _order_key(checkpoint['received'], checkpoint['order_id'])
+    created_since = checkpoint['received'][:10]
+
+    count = 0
+    for data in iter_order_pages(created_since, created_until, page_size):
+        for order in data:
+            if _order_key(order.get('Received'), order['WebshopOrderId']) <= high_water_mark:
+                continue
+            if count >= max_orders:
+                return
+            yield order['WebshopOrderId']
+            count += 1
+
+def sync_orders_incremental(created_until: str, initial_since: str, page_size: int = 30, max_orders: int = 10000,
+                            chunk_size: int = chunk_size) -> int:
+    # Resume from the last loaded chunk, or start at initial_since on the first run
+    checkpoint = checkpoint_store.load(checkpoint_name) or {'received': initial_since, 'order_id': ''}
+    print(f"Synchroniseren vanaf order {checkpoint['order_id'] or '-'} ({checkpoint['received']})")
+
+    def save_checkpoint(df: pd.DataFrame) -> None:
+        received, order_id = max(zip(df['ordered'], df['order_id'].astype(str)), key=lambda key: _order_key(*key))
+        new_checkpoint = {'received': received, 'order_id': order_id}
+        if _order_key(received, order_id) > _order_key(checkpoint['received'], checkpoint['order_id']):
+            checkpoint.update(new_checkpoint)
+            checkpoint_store.save(checkpoint_name, new_checkpoint)
+
+    order_ids = iter_new_order_ids(checkpoint, created_until, page_size, max_orders)
+    return run_order_pipeline(order_ids, transfer_data_to_bigquery, chunk_size, on_chunk_loaded=save_checkpoint)
+
 if __name__ == "__main__":
 
     # Define the order ids
@@ -122,24 +328,17 @@ if __name__ == "__main__":
     created_until = '2024-05-01'
     page_size = 30  # Maximum page size
     max_orders = 10000
-    all_order_ids = []
-
-    page = 0
-    while len(all_order_ids) < max_orders:
-        data = retrieve_order_ids(created_since, created_until, page, page_size)
-        if data:
-            order_ids = extract_order_ids(data)
-            if not order_ids:
-                break
-            all_order_ids.extend(order_ids)
-            if len(order_ids) < page_size:
-                break
-            page += 1
-        else:
-            break
 
-    all_order_ids = all_order_ids[:max_orders]
+    if os.getenv("MONTA_SYNC_MODE", "full") == 'incremental':
+        # Only fetch orders created after the last synced order
+        created_until = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        sync_orders_incremental(created_until, os.getenv("MONTA_SYNC_START", created_since), page_size, max_orders)
+    else:
+        # Enrichment starts while the next pages are still being fetched
+        order_ids = iter_order_ids(created_since, created_until, page_size, max_orders)
+
+        # Load data into bigquery in chunks while orders are still being enriched
+        run_order_pipeline(order_ids, transfer_data_to_bigquery)
 
-    # Load data into bigquery
-    df = create_order_dataframe(all_order_ids)
-    transfer_data_to_bigquery(df)
\ No newline at end of file
+    if monta_client.cache is not None:
+        print(monta_client.cache.report())
\ No newline at end of file
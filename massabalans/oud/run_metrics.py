@@ -0,0 +1,139 @@
+import atexit
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+# Scripts import this module while they start up, so the run time is counted from here
+IMPORTED_AT = time.perf_counter()
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # Highest memory use of this process (or its largest finished worker process) so far,
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+class RunMetrics:
+    # Wall time, rows, bytes, requests, retries and peak memory per stage of one run, written as one JSON line
+    # Counter sources (like the Monta client) are read before and after every stage, the stage gets the difference
+    # as '<source>_<counter>', for example monta_requests and monta_retries
+    # echo prints every stage when the run ends
+    def __init__(self, run_name: str, path: Optional[str] = None, profile_path: Optional[str] = None, start_time: Optional[float] = None,
+                 echo: bool = False):
+        self.run_name = run_name
+        self.path = path
+        self.echo = echo
+        self.start_time = time.perf_counter() if start_time is None else start_time
+        self.started = datetime.now() - timedelta(seconds=time.perf_counter() - self.start_time)
+        self.stages = []
+        self.counter_sources: dict[str, Callable[[], dict]] = {}
+        self.lock = threading.Lock()
+
+        # A profile_path ending in .html gets a pyinstrument report when it is installed, anything else cProfile stats
+        self.profile_path = profile_path
+        self.profiler = None
+        if profile_path and profile_path.endswith('.html'):
+            try:
+                from pyinstrument import Profiler
+                self.profiler = Profiler()
+                self.profiler.start()
+            except ImportError:
+                print("pyinstrument is niet geïnstalleerd, cProfile wordt gebruikt")
+                self.profile_path = os.path.splitext(profile_path)[0] + '.prof'
+        if profile_path and self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def add_counter_source(self, name: str, source: Callable[[], dict]) -> None:
+        self.counter_sources[name] = source
+
+    def _counters(self) -> dict:
+        counters = {}
+        for name, source in self.counter_sources.items():
+            for key, value in source().items():
+                counters[f"{name}_{key}"] = value
+        return counters
+
+    def record(self, name: str, seconds: float, **fields) -> None:
+        # For stages that were timed elsewhere, for example in a worker process
+        stage = {'name': name, 'seconds': round(seconds, 4), **fields}
+        with self.lock:
+            self.stages.append(stage)
+
+    @contextmanager
+    def stage(self, name: str, **fields):
+        # with metrics.stage('xlsx_parse') as stage: ... stage['rows'] = len(df)
+        stage = {'name': name, **fields}
+        counters_before = self._counters()
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield stage
+        except Exception as e:
+            stage['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stage['seconds'] = round(time.perf_counter() - start, 4)
+            counters_after = self._counters()
+            for key, value in counters_after.items():
+                if value != counters_before.get(key, 0):
+                    stage[key] = value - counters_before.get(key, 0)
+            stage['peak_rss_mb'] = round(peak_rss_mb(), 1)
+            stage['rss_growth_mb'] = round(stage['peak_rss_mb'] - rss_before, 1)
+            with self.lock:
+                self.stages.append(stage)
+
+    def summary(self) -> dict:
+        return {
+            'run': self.run_name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'seconds': round(time.perf_counter() - self.start_time, 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'worker_peak_rss_mb': round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            'stages': list(self.stages),
+        }
+
+    def emit(self) -> None:
+        # Append the run as one JSON line, so runs can be compared over time
+        if isinstance(self.profiler, cProfile.Profile):
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+        elif self.profiler is not None:
+            self.profiler.stop()
+            with open(self.profile_path, 'w') as file:
+                file.write(self.profiler.output_html())
+        if self.profiler is not None:
+            print(f"Profiel opgeslagen in {self.profile_path}")
+            self.profiler = None
+
+        if not self.stages:
+            return
+        summary = self.summary()
+        # A run that was emitted by hand is not emitted again at exit
+        self.stages = []
+        for stage in summary['stages'] if self.echo else []:
+            details = ', '.join(f"{key} {value}" for key, value in stage.items() if key not in ('name', 'seconds'))
+            print(f"[{self.run_name}] {stage['name']}: {stage['seconds']:.2f}s" + (f" ({details})" if details else ''))
+        if self.path:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(summary, default=str) + '\n')
+
+_run_metrics: Optional[RunMetrics] = None
+
+def get_run_metrics() -> RunMetrics:
+    # One collector per process, named after the script, emitted when the process exits
+    # METRICS_PATH is the JSON lines file the run is appended to, METRICS_PRINT=1 prints the stages at exit
+    # METRICS_PROFILE turns on profiling from here on and is where the profile goes
+    global _run_metrics
+    if _run_metrics is None:
+        run_name = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        _run_metrics = RunMetrics(run_name, os.getenv("METRICS_PATH"), os.getenv("METRICS_PROFILE"), IMPORTED_AT,
+                                  echo=bool(int(os.getenv("METRICS_PRINT", "0"))))
+        atexit.register(_run_metrics.emit)
+    return _run_metrics
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+from typing import Optional
+import pandas as pd
+from gspread.utils import absolute_range_name
+
+# Format of the local snapshot with row hashes per tab
+SNAPSHOT_VERSION = 2
+
+def frame_to_values(df: pd.DataFrame) -> list[list]:
+    # Header row followed by the data, the shape Google Sheets expects
+    return [df.columns.values.tolist()] + df.values.tolist()
+
+def _grid_requests(existing: dict, values: dict[str, list[list]]) -> list[dict]:
+    # Add missing tabs and grow tabs that are too small for the new data
+    requests = []
+    for sheet_name, rows in values.items():
+        row_count = max(len(rows), 1)
+        column_count = max(max((len(row) for row in rows), default=0), 1)
+
+        if sheet_name not in existing:
+            requests.append({'addSheet': {'properties': {
+                'title': sheet_name,
+                'gridProperties': {'rowCount': row_count, 'columnCount': column_count},
+            }}})
+            continue
+
+        grid = existing[sheet_name].get('gridProperties', {})
+        if grid.get('rowCount', 0) < row_count or grid.get('columnCount', 0) < column_count:
+            requests.append({'updateSheetProperties': {
+                'properties': {
+                    'sheetId': existing[sheet_name]['sheetId'],
+                    'gridProperties': {
+                        'rowCount': max(grid.get('rowCount', 0), row_count),
+                        'columnCount': max(grid.get('columnCount', 0), column_count),
+                    },
+                },
+                'fields': 'gridProperties.rowCount,gridProperties.columnCount',
+            }})
+    return requests
+
+def _row_hash(row: list) -> str:
+    return hashlib.sha1(json.dumps(row, default=str).encode('utf-8')).hexdigest()[:16]
+
+def _changed_blocks(old_hashes: list[str], new_hashes: list[str]) -> list[tuple[int, int]]:
+    # Contiguous [start, end) row blocks of the new data that differ from the snapshot
+    blocks = []
+    start = None
+    for index, row_hash in enumerate(new_hashes):
+        changed = index >= len(old_hashes) or old_hashes[index] != row_hash
+        if changed and start is None:
+            start = index
+        elif not changed and start is not None:
+            blocks.append((start, index))
+            start = None
+    if start is not None:
+        blocks.append((start, len(new_hashes)))
+    return blocks
+
+def snapshot_file(snapshot_path: str, spreadsheet_id: str) -> str:
+    # One snapshot file per spreadsheet next to snapshot_path, so reports that run at the same time
+    # never overwrite each other's hashes: sheets_snapshot.json -> sheets_snapshot.<spreadsheet id>.json
+    root, extension = os.path.splitext(snapshot_path)
+    return f"{root}.{spreadsheet_id}{extension or '.json'}"
+
+def _load_snapshot(path: str, spreadsheet_id: str) -> dict:
+    # A missing or unreadable snapshot means every tab is rewritten completely
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as file:
+            snapshot = json.load(file)
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('spreadsheet') != spreadsheet_id or not isinstance(snapshot.get('tabs'), dict):
+            raise ValueError("onbekend formaat")
+        return snapshot['tabs']
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"Snapshot {path} is onbruikbaar ({e}), alle werkbladen worden volledig herschreven.")
+        return {}
+
+def _save_snapshot(path: str, spreadsheet_id: str, tabs: dict) -> None:
+    # The temporary file is unique per process, the rename makes the new snapshot appear at once
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump({'version': SNAPSHOT_VERSION, 'spreadsheet': spreadsheet_id, 'tabs': tabs}, file)
+    os.replace(temp_path, path)
+
+def sync_sheets(spreadsheet, frames: dict[str, pd.DataFrame], snapshot_path: Optional[str] = None) -> None:
+    # Replace the contents of every tab with at most four API calls for the whole spreadsheet:
+    # read metadata, add/resize tabs, clear ranges and write ranges
+    # With a snapshot only rows that changed since the last push are written, and rows that disappeared are cleared
+    metadata = spreadsheet.fetch_sheet_metadata()
+    existing = {sheet['properties']['title']: sheet['properties'] for sheet in metadata.get('sheets', [])}
+    values = {sheet_name: frame_to_values(df) for sheet_name, df in frames.items()}
+    hashes = {sheet_name: [_row_hash(row) for row in rows] for sheet_name, rows in values.items()}
+    if snapshot_path:
+        snapshot_path = snapshot_file(snapshot_path, spreadsheet.id)
+    previous = _load_snapshot(snapshot_path, spreadsheet.id) if snapshot_path else {}
+
+    requests = _grid_requests(existing, values)
+    if requests:
+        spreadsheet.batch_update({'requests': requests})
+
+    clear_ranges = []
+    data = []
+    for sheet_name, rows in values.items():
+        old_hashes = previous.get(sheet_name)
+        new_hashes = hashes[sheet_name]
+
+        # Rewrite the whole tab if we don't know what is on it or the columns changed
+        if sheet_name not in existing or not old_hashes or old_hashes[0] != new_hashes[0]:
+            if sheet_name in existing:
+                clear_ranges.append(absolute_range_name(sheet_name))
+            data.append({'range': absolute_range_name(sheet_name, 'A1'), 'values': rows})
+            print(f"{sheet_name} werkblad {'bijgewerkt' if sheet_name in existing else 'toegevoegd'}.")
+            continue
+
+        blocks = _changed_blocks(old_hashes, new_hashes)
+        for start, end in blocks:
+            data.append({'range': absolute_range_name(sheet_name, f'A{start + 1}'), 'values': rows[start:end]})
+        if len(old_hashes) > len(new_hashes):
+            clear_ranges.append(absolute_range_name(sheet_name, f'{len(new_hashes) + 1}:{len(old_hashes)}'))
+
+        changed_rows = sum(end - start for start, end in blocks)
+        removed_rows = max(len(old_hashes) - len(new_hashes), 0)
+        print(f"{sheet_name} werkblad: {changed_rows} rijen bijgewerkt, {removed_rows} rijen verwijderd.")
+
+    if clear_ranges:
+        spreadsheet.values_batch_clear(body={'ranges': clear_ranges})
+    if data:
+        spreadsheet.values_batch_update({'valueInputOption': 'RAW', 'data': data})
+
+    if snapshot_path:
+        _save_snapshot(snapshot_path, spreadsheet.id, hashes)
@@ -0,0 +1,91 @@
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+# Namespaces used inside an xlsx package
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+def _column_index(cell_reference: str) -> int:
+    # 'A1' -> 0, 'AB12' -> 27
+    index = 0
+    for char in cell_reference:
+        if char.isdigit():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+def _first_sheet_path(archive: zipfile.ZipFile) -> str:
+    # Follow workbook.xml -> workbook.xml.rels to the first worksheet, like pd.read_excel(sheet_name=0)
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    sheet = workbook.find(f'{MAIN_NS}sheets/{MAIN_NS}sheet')
+    relation_id = sheet.get(f'{REL_NS}id')
+
+    relations = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for relation in relations.iter(f'{PACKAGE_REL_NS}Relationship'):
+        if relation.get('Id') == relation_id:
+            target = relation.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError("Geen werkblad gevonden in het Excel-bestand.")
+
+def _shared_strings(archive: zipfile.ZipFile) -> list[str]:
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as file:
+        for _, element in ET.iterparse(file):
+            if element.tag == f'{MAIN_NS}si':
+                strings.append(''.join(text.text or '' for text in element.iter(f'{MAIN_NS}t')))
+                element.clear()
+    return strings
+
+def _cell_value(cell: ET.Element, shared_strings: list[str]):
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        value = ''.join(text.text or '' for text in cell.iter(f'{MAIN_NS}t'))
+        return value if value != '' else None
+
+    value = cell.findtext(f'{MAIN_NS}v')
+    if value is None or value == '':
+        return None
+    if cell_type == 'n':
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    if cell_type == 's':
+        return shared_strings[int(value)] or None
+    if cell_type == 'b':
+        return value == '1'
+    if cell_type == 'e':
+        return None
+    return value
+
+def read_xlsx_report(original_report: str) -> pd.DataFrame:
+    # Stream the first worksheet row by row without ever opening styles.xml,
+    # so the broken Monta styles don't matter and no temp files are needed
+    # The rows go through the same TextParser as pd.read_excel, so dtypes and NaN handling match
+    rows = []
+    with zipfile.ZipFile(original_report, 'r') as archive:
+        shared_strings = _shared_strings(archive)
+        with archive.open(_first_sheet_path(archive)) as file:
+            for _, element in ET.iterparse(file):
+                if element.tag != f'{MAIN_NS}row':
+                    continue
+
+                row = []
+                for position, cell in enumerate(element.iter(f'{MAIN_NS}c')):
+                    reference = cell.get('r')
+                    index = _column_index(reference) if reference else position
+                    if index > len(row):
+                        row.extend([None] * (index - len(row)))
+                    row.append(_cell_value(cell, shared_strings))
+                element.clear()
+                rows.append(row)
+
+    if not rows:
+        return pd.DataFrame()
+    return TextParser(rows, header=0).read()
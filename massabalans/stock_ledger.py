@@ -0,0 +1,90 @@
+import os
+from datetime import date, datetime
+from typing import Optional
+import pandas as pd
+from bq_query import run_query
+
+# Columns that identify a stock line
+KEYS = ['Product', 'Batch']
+
+def stock_range_query(full_table_id: str) -> str:
+    # A range on Timestamp itself, so BigQuery only scans the partitions of these days
+    # Parameters: @first_day, @last_day
+    return f"""
+SELECT
+    DATE(Timestamp) AS Datum,
+    Product,
+    Batch,
+    Aantal
+FROM
+    `{full_table_id}`
+WHERE Timestamp >= TIMESTAMP(@first_day)
+  AND Timestamp < TIMESTAMP(DATE_ADD(@last_day, INTERVAL 1 DAY))
+"""
+
+def snapshot_path(cache_dir: str, day: date) -> str:
+    return os.path.join(cache_dir, f"stock_{day.isoformat()}.parquet")
+
+def contiguous_runs(days: list[date]) -> list[tuple[date, date]]:
+    # [first, last] of every run of consecutive days, so cached days in between are not scanned again
+    runs = []
+    for day in sorted(days):
+        if runs and (day - runs[-1][1]).days == 1:
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+def load_daily_snapshots(full_table_id: str, first_day: date, last_day: date, cache_dir: str, client, max_bytes: Optional[int] = None) -> pd.DataFrame:
+    # Daily snapshots come from the Parquet cache, every run of missing days is pulled with one query
+    # Only past days with stock are cached: an empty day may not be loaded yet or be backfilled later,
+    # and today's snapshot can still change, so those are fetched again on the next run
+    days = list(pd.date_range(first_day, last_day).date)
+    today = datetime.now().date()
+    missing = [day for day in days if day >= today or not os.path.exists(snapshot_path(cache_dir, day))]
+
+    fetched = {}
+    for run_first, run_last in contiguous_runs(missing):
+        print(f"Voorraad ophalen van {run_first} t/m {run_last}")
+        params = {'first_day': run_first, 'last_day': run_last}
+        result = run_query(client, stock_range_query(full_table_id), params, max_bytes)
+        result['Datum'] = pd.to_datetime(result['Datum']).dt.date
+        per_day = dict(tuple(result.groupby('Datum')))
+
+        os.makedirs(cache_dir, exist_ok=True)
+        for day in pd.date_range(run_first, run_last).date:
+            frame = per_day.get(day, result.iloc[0:0])[KEYS + ['Aantal']].reset_index(drop=True)
+            if day < today and not frame.empty:
+                frame.to_parquet(snapshot_path(cache_dir, day), index=False)
+            elif frame.empty:
+                print(f"Geen voorraad gevonden voor {day}, deze dag wordt niet gecachet")
+            fetched[day] = frame
+
+    frames = []
+    for day in days:
+        frame = fetched[day] if day in fetched else pd.read_parquet(snapshot_path(cache_dir, day))
+        frames.append(frame.assign(Datum=day))
+    return pd.concat(frames, ignore_index=True)[['Datum'] + KEYS + ['Aantal']]
+
+def build_ledger(snapshots: pd.DataFrame, first_day: date, last_day: date, freq: str = 'W') -> pd.DataFrame:
+    # Opening stock is the snapshot on the first day of every period, closing stock the one on the last day
+    # All periods are computed in one pass over the snapshots
+    snapshots = snapshots.copy()
+    dates = pd.to_datetime(snapshots['Datum'])
+    periods = dates.dt.to_period(freq)
+    period_start = periods.dt.start_time.clip(lower=pd.Timestamp(first_day)).dt.normalize()
+    period_end = periods.dt.end_time.clip(upper=pd.Timestamp(last_day)).dt.normalize()
+
+    snapshots['Periode'] = periods.astype(str)
+    snapshots['Soort'] = None
+    snapshots.loc[dates == period_start, 'Soort'] = 'Begin'
+    closing = snapshots[dates == period_end].assign(Soort='Eind')
+    snapshots = pd.concat([snapshots[snapshots['Soort'].notna()], closing], ignore_index=True)
+
+    # pivot_table drops rows with a missing key, products without a batch are kept under an empty Batch
+    snapshots[KEYS] = snapshots[KEYS].fillna('')
+    ledger = snapshots.pivot_table(index=['Periode'] + KEYS, columns='Soort', values='Aantal', aggfunc='sum', fill_value=0)
+    ledger = ledger.reindex(columns=['Begin', 'Eind'], fill_value=0).reset_index()
+    ledger.columns.name = None
+    ledger['Mutatie'] = ledger['Eind'] - ledger['Begin']
+    return ledger[['Periode'] + KEYS + ['Begin', 'Mutatie', 'Eind']]
@@ -1,4 +1,4 @@
-import pandas_gbq as pd_gbq
+import pandas as pd
 import os
 from dotenv import load_dotenv
 from google.oauth2 import service_account
@@ -6,6 +6,9 @@ from datetime import datetime, timedelta
 from google.cloud import bigquery
 from tabulate import tabulate
 import matplotlib.pyplot as plt
+from stock_ledger import load_daily_snapshots, build_ledger
+from bq_query import run_query, max_bytes_from_env
+from run_metrics import get_run_metrics
 
 # Load .env
 load_dotenv()
@@ -16,71 +19,69 @@ last_day_of_week = first_day_of_week + timedelta(days=6)
 
 # Load possible environment dates
 start_date = os.getenv("START_DATE", first_day_of_week.strftime("%Y-%m-%d"))
-print(start_date)
 end_date = os.getenv("END_DATE", last_day_of_week.strftime("%Y-%m-%d"))
-print(end_date)
 
-# Get the GCP keys
-gc_keys = os.getenv("AARDG_GOOGLE_CREDENTIALS")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gc_keys
+# Columns that identify a stock line
+KEYS = ['Product', 'Batch']
 
-credentials = service_account.Credentials.from_service_account_file(gc_keys)
-project_id = credentials.project_id
-client = bigquery.Client(credentials=credentials, project=project_id)
-
-# Define variables
-dataset_id = os.getenv("STOCK_DATASET_ID")
-table_id = os.getenv("STOCK_TABLE_ID")
-full_table_id = f'{project_id}.{dataset_id}.{table_id}'
-
-# Get the starting stock from BigQuery
-query_1 = f"""
+# Dates are passed as @parameters and filtered with a range on Timestamp itself, so BigQuery can prune partitions
+def stock_snapshot_query(full_table_id: str) -> str:
+    # Parameters: @date
+    return f"""
 SELECT
     Product,
     Batch,
     Aantal
 FROM
     `{full_table_id}`
-WHERE DATE(Timestamp) = '{start_date}'
+WHERE Timestamp >= TIMESTAMP(@date)
+  AND Timestamp < TIMESTAMP(DATE_ADD(@date, INTERVAL 1 DAY))
 """
 
-# Get the end stock from BigQuery
-query_2 = f"""
+def stock_mutation_query(full_table_id: str) -> str:
+    # Start, end and mutation per Product/Batch in one query, missing combinations count as 0
+    # NULL never equals NULL in the join, so a missing Product or Batch is compared as ''
+    # Parameters: @start_date, @end_date
+    return f"""
+WITH start_stock AS (
+    SELECT COALESCE(Product, '') AS Product, COALESCE(Batch, '') AS Batch, Aantal
+    FROM `{full_table_id}`
+    WHERE Timestamp >= TIMESTAMP(@start_date)
+      AND Timestamp < TIMESTAMP(DATE_ADD(@start_date, INTERVAL 1 DAY))
+),
+end_stock AS (
+    SELECT COALESCE(Product, '') AS Product, COALESCE(Batch, '') AS Batch, Aantal
+    FROM `{full_table_id}`
+    WHERE Timestamp >= TIMESTAMP(@end_date)
+      AND Timestamp < TIMESTAMP(DATE_ADD(@end_date, INTERVAL 1 DAY))
+)
 SELECT
-    Product,
-    Batch,
-    Aantal
-FROM
-    `{full_table_id}`
-WHERE DATE(Timestamp) = '{end_date}'
+    COALESCE(end_stock.Product, start_stock.Product) AS Product,
+    COALESCE(end_stock.Batch, start_stock.Batch) AS Batch,
+    COALESCE(start_stock.Aantal, 0) AS Aantal_start,
+    COALESCE(end_stock.Aantal, 0) AS Aantal_end,
+    COALESCE(end_stock.Aantal, 0) - COALESCE(start_stock.Aantal, 0) AS Aantal
+FROM start_stock
+FULL OUTER JOIN end_stock
+    ON start_stock.Product = end_stock.Product AND start_stock.Batch = end_stock.Batch
 """
 
-starting_stock = pd_gbq.read_gbq(query_1, credentials=credentials, project_id=project_id)
-end_stock = pd_gbq.read_gbq(query_2, credentials=credentials, project_id=project_id)
-
-# Function to fill missing Product - Batch combinations
-def fill_missing_combinations(df1, df2):
-    products_df1 = set(zip(df1['Product'], df1['Batch']))
-    products_df2 = set(zip(df2['Product'], df2['Batch']))
-    
-    missing_in_df1 = products_df2 - products_df1
-    missing_in_df2 = products_df1 - products_df2
-    
-    # Voeg ontbrekende combinaties toe met Aantal = 0
-    for product, batch in missing_in_df1:
-        df1 = df1._append({'Product': product, 'Batch': batch, 'Aantal': 0}, ignore_index=True)
-        
-    for product, batch in missing_in_df2:
-        df2 = df2._append({'Product': product, 'Batch': batch, 'Aantal': 0}, ignore_index=True)
-        
-    return df1, df2
-
-# Fill missing Product - Batch combinations
-starting_stock, end_stock = fill_missing_combinations(starting_stock, end_stock)
-
-# Calculate the mutations
-mutation = end_stock.merge(starting_stock, on=['Product', 'Batch'], suffixes=('_end', '_start'))
-mutation['Aantal'] = mutation['Aantal_end'] - mutation['Aantal_start']
+def compute_mutations(starting_stock: pd.DataFrame, end_stock: pd.DataFrame) -> pd.DataFrame:
+    # Same result as stock_mutation_query, in pandas: one outer merge, missing combinations count as 0
+    # A missing Product or Batch becomes '' like in the query
+    starting_stock = starting_stock[KEYS + ['Aantal']].fillna({key: '' for key in KEYS})
+    end_stock = end_stock[KEYS + ['Aantal']].fillna({key: '' for key in KEYS})
+    stock = starting_stock.merge(end_stock, on=KEYS, how='outer', suffixes=('_start', '_end'))
+    stock[['Aantal_start', 'Aantal_end']] = stock[['Aantal_start', 'Aantal_end']].fillna(0)
+    stock['Aantal'] = stock['Aantal_end'] - stock['Aantal_start']
+    return stock
+
+def split_stock(stock: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    # Starting stock, mutation and end stock as separate Product/Batch/Aantal frames
+    starting_stock = stock[KEYS + ['Aantal_start']].rename(columns={'Aantal_start': 'Aantal'})
+    mutation = stock[KEYS + ['Aantal']]
+    end_stock = stock[KEYS + ['Aantal_end']].rename(columns={'Aantal_end': 'Aantal'})
+    return starting_stock, mutation, end_stock
 
 '''# Create a function for making a table
 def create_table(df, title):
@@ -107,14 +108,71 @@ def create_table_plot(df, title, ax):
     table.scale(1.2, 1.2)
     ax.set_title(title, pad=20)
 
-# Create plots
-fig, axs = plt.subplots(3, 1, figsize=(10, 15))
-
-create_table_plot(starting_stock[['Product', 'Batch', 'Aantal']], f"Begin Vooraad: {start_date})", axs[0])
-create_table_plot(mutation[['Product', 'Batch', 'Aantal']], "Mutatie", axs[1])
-create_table_plot(end_stock[['Product', 'Batch', 'Aantal']], f"Eind Vooraad: {end_date})", axs[2])
-
-# Save the figure
-plt.tight_layout()
-plt.savefig("/Users/maxrood/werk/codering/aardg/projecten/skal/massabalans/stock_tables.jpeg")
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    # run_metrics lives in oud/: PYTHONPATH=oud python stock_overview.py
+    print(start_date)
+    print(end_date)
+
+    # Get the GCP keys
+    gc_keys = os.getenv("AARDG_GOOGLE_CREDENTIALS")
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gc_keys
+
+    credentials = service_account.Credentials.from_service_account_file(gc_keys)
+    project_id = credentials.project_id
+    client = bigquery.Client(credentials=credentials, project=project_id)
+
+    # Define variables
+    dataset_id = os.getenv("STOCK_DATASET_ID")
+    table_id = os.getenv("STOCK_TABLE_ID")
+    full_table_id = f'{project_id}.{dataset_id}.{table_id}'
+
+    mode = os.getenv("STOCK_OVERVIEW_MODE", "bigquery")
+    first_day = datetime.strptime(start_date, "%Y-%m-%d").date()
+    last_day = datetime.strptime(end_date, "%Y-%m-%d").date()
+    max_bytes = max_bytes_from_env()
+
+    # Results of closed periods don't change anymore, so only those are cached
+    query_cache_dir = os.getenv("BQ_CACHE_DIR") if last_day < datetime.now().date() else None
+
+    metrics = get_run_metrics()
+    if mode == 'ledger':
+        # Opening stock, mutation and closing stock for every period between START_DATE and END_DATE
+        cache_dir = os.getenv("STOCK_CACHE_DIR", "stock_cache")
+        with metrics.stage('bigquery_query', mode=mode) as stage:
+            snapshots = load_daily_snapshots(full_table_id, first_day, last_day, cache_dir, client, max_bytes)
+            stage['rows'] = len(snapshots)
+        with metrics.stage('aggregation') as stage:
+            ledger = build_ledger(snapshots, first_day, last_day, os.getenv("LEDGER_PERIOD", "W"))
+            stage['rows'] = len(ledger)
+        print(tabulate(ledger, headers='keys', showindex=False, tablefmt='grid'))
+        raise SystemExit
+
+    if mode == 'local':
+        # Download both snapshots and combine them in pandas
+        with metrics.stage('bigquery_query', mode=mode) as stage:
+            starting_stock = run_query(client, stock_snapshot_query(full_table_id), {'date': first_day}, max_bytes, query_cache_dir)
+            end_stock = run_query(client, stock_snapshot_query(full_table_id), {'date': last_day}, max_bytes, query_cache_dir)
+            stage['rows'] = len(starting_stock) + len(end_stock)
+        with metrics.stage('aggregation') as stage:
+            stock = compute_mutations(starting_stock, end_stock)
+            stage['rows'] = len(stock)
+    else:
+        # Let BigQuery combine both snapshots and only download the result
+        params = {'start_date': first_day, 'end_date': last_day}
+        with metrics.stage('bigquery_query', mode=mode) as stage:
+            stock = run_query(client, stock_mutation_query(full_table_id), params, max_bytes, query_cache_dir)
+            stage['rows'] = len(stock)
+
+    starting_stock, mutation, end_stock = split_stock(stock)
+
+    # Create plots
+    fig, axs = plt.subplots(3, 1, figsize=(10, 15))
+
+    create_table_plot(starting_stock[['Product', 'Batch', 'Aantal']], f"Begin Vooraad: {start_date})", axs[0])
+    create_table_plot(mutation[['Product', 'Batch', 'Aantal']], "Mutatie", axs[1])
+    create_table_plot(end_stock[['Product', 'Batch', 'Aantal']], f"Eind Vooraad: {end_date})", axs[2])
+
+    # Save the figure
+    plt.tight_layout()
+    plt.savefig("/Users/maxrood/werk/codering/aardg/projecten/skal/massabalans/stock_tables.jpeg")
+    plt.show()
@@ -0,0 +1,14 @@
+import os
+import sys
+
+# The scripts import each other as flat modules from massabalans/ and massabalans/oud/
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+for path in (TESTS_DIR, ROOT_DIR, os.path.join(ROOT_DIR, 'oud')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Tests never write or print run metrics
+os.environ.pop("METRICS_PATH", None)
+os.environ.pop("METRICS_PROFILE", None)
+os.environ.pop("METRICS_PRINT", None)
@@ -0,0 +1,79 @@
+import pandas as pd
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+from arrow_staging import bigquery_type
+
+class FakeQueryJob:
+    def __init__(self, result: pd.DataFrame = None, total_bytes_processed: int = 0, num_dml_affected_rows: int = None):
+        self._result = result if result is not None else pd.DataFrame()
+        self.total_bytes_processed = total_bytes_processed
+        self.num_dml_affected_rows = num_dml_affected_rows
+
+    def result(self):
+        return self
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return self._result.copy()
+
+class FakeLoadJob:
+    def __init__(self, output_rows: int):
+        self.output_rows = output_rows
+
+    def result(self):
+        return self
+
+class FakeBigQueryClient:
+    # Records every query with its parameters, dry runs report bytes_per_query and real runs return results(sql, params)
+    # tables maps a table id to its column types, for get_table, loaded Parquet files are kept per table in rows
+    def __init__(self, results=None, bytes_per_query: int = 0, tables: dict[str, dict[str, str]] = None):
+        self.results = results or (lambda sql, params: pd.DataFrame())
+        self.bytes_per_query = bytes_per_query
+        self.tables = dict(tables or {})
+        self.rows = {}
+        self.queries = []
+        self.updated = []
+        self.deleted = []
+
+    def load_table_from_file(self, file, table_id: str, job_config=None) -> FakeLoadJob:
+        table = pq.read_table(file)
+        loaded = table.to_pandas()
+        if job_config.write_disposition == bigquery.WriteDisposition.WRITE_APPEND and table_id in self.rows:
+            loaded = pd.concat([self.rows[table_id], loaded], ignore_index=True)
+        self.rows[table_id] = loaded
+        self.tables[table_id] = {field.name: bigquery_type(field.type) for field in table.schema}
+        return FakeLoadJob(table.num_rows)
+
+    def update_table(self, table: bigquery.Table, fields: list[str]) -> bigquery.Table:
+        self.updated.append((table.table_id, tuple(fields)))
+        return table
+
+    def delete_table(self, table_id: str, not_found_ok: bool = False) -> None:
+        if table_id not in self.tables and not not_found_ok:
+            raise NotFound(f"Table {table_id} not found")
+        self.tables.pop(table_id, None)
+        self.rows.pop(table_id, None)
+        self.deleted.append(table_id)
+
+    def get_table(self, table_id: str) -> bigquery.Table:
+        if table_id not in self.tables:
+            raise NotFound(f"Table {table_id} not found")
+        schema = [bigquery.SchemaField(name, field_type) for name, field_type in self.tables[table_id].items()]
+        return bigquery.Table(table_id, schema=schema)
+
+    def executed(self) -> list[dict]:
+        return [query for query in self.queries if not query['dry_run']]
+
+    def query(self, sql: str, job_config=None) -> FakeQueryJob:
+        params = {param.name: param.value for param in job_config.query_parameters} if job_config else {}
+        dry_run = bool(job_config and job_config.dry_run)
+        self.queries.append({
+            'sql': sql,
+            'params': params,
+            'types': {param.name: param.type_ for param in job_config.query_parameters} if job_config else {},
+            'dry_run': dry_run,
+            'maximum_bytes_billed': job_config.maximum_bytes_billed if job_config else None,
+        })
+        if dry_run:
+            return FakeQueryJob(total_bytes_processed=self.bytes_per_query)
+        return FakeQueryJob(self.results(sql, params), total_bytes_processed=self.bytes_per_query)
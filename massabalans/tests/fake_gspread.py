@@ -0,0 +1,59 @@
+import re
+from collections import Counter
+
+class FakeSpreadsheet:
+    # Keeps the tabs of a spreadsheet in memory and counts every API call that sync_sheets makes
+    def __init__(self, spreadsheet_id: str = 'spreadsheet', tabs: dict[str, list[list]] = None):
+        self.id = spreadsheet_id
+        self.tabs = {name: [list(row) for row in rows] for name, rows in (tabs or {}).items()}
+        self.grid = {name: (max(len(rows), 1000), 26) for name, rows in self.tabs.items()}
+        self.calls = Counter()
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.calls.values())
+
+    def fetch_sheet_metadata(self) -> dict:
+        self.calls['fetch_sheet_metadata'] += 1
+        return {'sheets': [
+            {'properties': {'title': name, 'sheetId': index, 'gridProperties': {'rowCount': rows, 'columnCount': columns}}}
+            for index, (name, (rows, columns)) in enumerate(self.grid.items())
+        ]}
+
+    def batch_update(self, body: dict) -> None:
+        self.calls['batch_update'] += 1
+        titles = list(self.grid)
+        for request in body['requests']:
+            if 'addSheet' in request:
+                properties = request['addSheet']['properties']
+                grid = properties['gridProperties']
+                self.tabs[properties['title']] = []
+                self.grid[properties['title']] = (grid['rowCount'], grid['columnCount'])
+            else:
+                properties = request['updateSheetProperties']['properties']
+                grid = properties['gridProperties']
+                self.grid[titles[properties['sheetId']]] = (grid['rowCount'], grid['columnCount'])
+
+    def values_batch_clear(self, body: dict) -> None:
+        self.calls['values_batch_clear'] += 1
+        for range_name in body['ranges']:
+            match = re.fullmatch(r"'(.*)'(?:!(\d+):(\d+))?", range_name)
+            name, first, last = match.group(1), match.group(2), match.group(3)
+            rows = self.tabs[name]
+            if first is None:
+                rows.clear()
+            else:
+                for index in range(int(first) - 1, min(int(last), len(rows))):
+                    rows[index] = []
+            while rows and not rows[-1]:
+                rows.pop()
+
+    def values_batch_update(self, body: dict) -> None:
+        self.calls['values_batch_update'] += 1
+        for data in body['data']:
+            match = re.fullmatch(r"'(.*)'!A(\d+)", data['range'])
+            rows = self.tabs[match.group(1)]
+            start = int(match.group(2)) - 1
+            rows.extend([] for _ in range(start + len(data['values']) - len(rows)))
+            for offset, row in enumerate(data['values']):
+                rows[start + offset] = list(row)
@@ -0,0 +1,170 @@
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# EAN of a product in products.json, so fixture rows survive add_product_names
+FIXTURE_SKU = '8719326399355'
+
+def make_order(order_id, received: str) -> dict:
+    address = {'FirstName': 'Test', 'LastName': f'Klant {order_id}', 'EmailAddress': f'{order_id}@example.com',
+               'Street': 'Straat', 'HouseNumber': '1', 'HouseNumberAddition': '', 'PostalCode': '1234AB',
+               'City': 'Utrecht', 'CountryCode': 'NL'}
+    return {'WebshopOrderId': order_id, 'Received': received, 'Shipped': received, 'ConsumerDetails': {'DeliveryAddress': address}}
+
+def make_batches(order_id, quantity: int = 1) -> dict:
+    return {'BatchLines': [{'Sku': FIXTURE_SKU, 'Quantity': -quantity, 'BatchContent': {'Title': f'B{order_id}', 'BestBefore': '2027-01-01'}}]}
+
+def content_md5(body: bytes) -> str:
+    return base64.b64encode(hashlib.md5(body).digest()).decode()
+
+class StubMonta:
+    # Local Monta API on a free port: orders, batches, order pages and report files
+    # latency is added to every response, failures maps a path to statuses that are returned before the real answer,
+    # rate_limit makes the server answer 429 with Retry-After when a request arrives without budget,
+    # the budget is rate_limit requests per second with bursts up to rate_limit, like Monta's
+    def __init__(self, orders: list[dict] = (), reports: dict[str, bytes] = None, latency: float = 0.0,
+                 rate_limit: float = None, keep_alive: bool = True):
+        self.orders = list(orders)
+        self.orders_by_id = {str(order['WebshopOrderId']): order for order in self.orders}
+        self.batches = {}
+        self.reports = reports or {}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.failures: dict[str, list[int]] = {}
+        # Pages of the orders listing in the order they were requested, and pages that always answer 500
+        self.order_pages: list[int] = []
+        self.failed_pages: set[int] = set()
+        self.requests = Counter()
+        self.throttled = 0
+        self.not_modified = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self._tokens = rate_limit or 0
+        self._updated = time.monotonic()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' if keep_alive else 'HTTP/1.0'
+            # Headers and body are written separately, without this every response waits for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._handle(self)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _over_rate(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+            self._updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                return True
+            self._tokens -= 1
+            return False
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        url = urlparse(handler.path)
+        path = url.path.lstrip('/')
+        with self.lock:
+            self.requests[path] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failures = self.failures.get(path)
+            status = failures.pop(0) if failures else None
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if status is not None:
+                self._send(handler, status, b'{}', {'Retry-After': '0'} if status == 429 else {})
+            elif self.rate_limit is not None and self._over_rate():
+                self._send(handler, 429, b'{}', {'Retry-After': '0.2'})
+            else:
+                self._route(handler, path, parse_qs(url.query))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def _route(self, handler: BaseHTTPRequestHandler, path: str, query: dict) -> None:
+        if path == 'orders':
+            page = int(query['page'][0])
+            page_size = int(query['page_size'][0])
+            with self.lock:
+                self.order_pages.append(page)
+            if page in self.failed_pages:
+                return self._send(handler, 500, b'{}')
+            since = query['created_since'][0]
+            until = query['created_until'][0]
+            selected = [order for order in self.orders if since <= order['Received'][:10] < until]
+            return self._json(handler, selected[page * page_size:(page + 1) * page_size])
+
+        match = re.fullmatch(r'order/([^/]+)(/batches)?', path)
+        if match and match.group(1) in self.orders_by_id:
+            order_id = match.group(1)
+            if match.group(2):
+                return self._json(handler, self.batches.get(order_id) or make_batches(order_id))
+            return self._json(handler, self.orders_by_id[order_id])
+
+        match = re.fullmatch(r'reports/([^/]+)/file', path)
+        if match and match.group(1) in self.reports:
+            return self._range(handler, self.reports[match.group(1)])
+
+        self._send(handler, 404, b'{}')
+
+    def _json(self, handler: BaseHTTPRequestHandler, data) -> None:
+        # Every JSON body has an ETag, a request that already has this version gets a 304 without a body
+        body = json.dumps(data).encode('utf-8')
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if handler.headers.get('If-None-Match') == etag:
+            with self.lock:
+                self.not_modified += 1
+            return self._send(handler, 304, b'', {'ETag': etag})
+        self._send(handler, 200, body, {'Content-Type': 'application/json', 'ETag': etag})
+
+    def _range(self, handler: BaseHTTPRequestHandler, body: bytes) -> None:
+        # Content-MD5 covers the body that is sent, so for a 206 only the requested part
+        match = re.fullmatch(r'bytes=(\d+)-', handler.headers.get('Range', ''))
+        if not match:
+            return self._send(handler, 200, body, {'Content-MD5': content_md5(body)})
+        offset = int(match.group(1))
+        if offset >= len(body):
+            return self._send(handler, 416, b'', {'Content-Range': f'bytes */{len(body)}'})
+        part = body[offset:]
+        self._send(handler, 206, part, {'Content-Range': f'bytes {offset}-{len(body) - 1}/{len(body)}', 'Content-MD5': content_md5(part)})
+
+    def _send(self, handler: BaseHTTPRequestHandler, status: int, body: bytes, headers: dict = None) -> None:
+        handler.send_response(status)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
@@ -0,0 +1,51 @@
+import os
+import numpy as np
+from openpyxl import Workbook
+from report_pipeline import REPORT_SPECS
+from stub_monta import FIXTURE_SKU
+
+# Excel serial of 2024-06-01
+FIRST_SERIAL = 45444
+
+SKUS = [FIXTURE_SKU, '8719326399362', '8719326399379']
+
+def report_rows(report_name: str, rows: int, seed: int = 0) -> list[list]:
+    # The columns of the Monta report with a header row, dates as Excel serials like in the real exports
+    spec = REPORT_SPECS[report_name]
+    rng = np.random.default_rng(seed)
+    header = list(spec.columns)
+    values = []
+    for row in range(rows):
+        line = []
+        for column in header:
+            name = spec.columns[column]
+            if name in spec.date_columns:
+                line.append(FIRST_SERIAL + int(rng.integers(0, 30)))
+            elif name == spec.value:
+                line.append(int(rng.integers(1, 10)))
+            elif name == 'SKU':
+                line.append(SKUS[int(rng.integers(0, len(SKUS)))])
+            elif spec.row_filter and column == spec.row_filter[0]:
+                line.append(spec.row_filter[1] if rng.random() < 0.8 else 'Afgekeurd')
+            else:
+                line.append(f'{name} {int(rng.integers(0, 3))}')
+        values.append(line)
+    return [header] + values
+
+def write_report_file(path: str, report_name: str, rows: int = 50, seed: int = 0) -> str:
+    workbook = Workbook()
+    sheet = workbook.active
+    for line in report_rows(report_name, rows, seed):
+        sheet.append(line)
+    workbook.save(path)
+    return path
+
+def make_report_folder(folder: str, days: list[str], report_names: list[str], rows: int = 50) -> list[str]:
+    # One '<prefix> YYYY-MM-DD.xlsx' per report type and day, every file with its own content
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for report_name in report_names:
+        for seed, day in enumerate(days):
+            path = os.path.join(folder, f"{REPORT_SPECS[report_name].file_prefix} {day}.xlsx")
+            paths.append(write_report_file(path, report_name, rows, seed))
+    return paths
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+# The 8 columns that the scripts collapsed duplicate sales lines on before collapse_duplicates
+LEGACY_DUPLICATE_KEYS = ['OrderNummer', 'Besteldatum', 'Verzenddatum', 'SKU', 'Omschrijving', 'Batch', 'THT_Datum', 'Orderstatus']
+
+def make_sales_lines(rows: int, seed: int = 0, orders: int = None, skus: int = 40, missing: float = 0.1) -> pd.DataFrame:
+    # Sales lines like the converted Monta export, with few enough orders that lines repeat
+    # Batch and THT_Datum are missing for a share of the lines, like for products without a batch
+    rng = np.random.default_rng(seed)
+    orders = orders or max(rows // 4, 1)
+    order_ids = rng.integers(0, orders, rows)
+    sku_index = rng.integers(0, skus, rows)
+    start = pd.Timestamp('2024-01-01')
+    # Every batch has one THT date
+    batch_index = pd.Series(rng.integers(0, 5, rows)).where(rng.random(rows) >= missing)
+    batches = pd.Series(np.array([f'B{batch}' for batch in range(5)])[batch_index.fillna(0).astype(int)]).where(batch_index.notna())
+    tht = start + pd.to_timedelta(batch_index + 200, unit='D')
+    ordered = start + pd.to_timedelta(order_ids % 120, unit='D')
+    return pd.DataFrame({
+        'OrderNummer': pd.Series(order_ids + 100000).astype(str),
+        'Besteldatum': ordered,
+        'Verzenddatum': pd.Series(ordered + pd.to_timedelta(rng.integers(0, 2, rows), unit='D')).where(rng.random(rows) >= missing),
+        'SKU': np.array([f'87193263{index:05d}' for index in range(skus)])[sku_index],
+        'Omschrijving': np.array([f'Product {index}' for index in range(skus)])[sku_index],
+        'Aantal': rng.integers(1, 6, rows),
+        'Batch': batches,
+        'THT_Datum': tht,
+        'Orderstatus': rng.choice(['Verzonden', 'Queued'], rows, p=[0.9, 0.1]),
+    })
+
+def legacy_collapse(df: pd.DataFrame, keys: list[str], value: str = 'Aantal') -> pd.DataFrame:
+    # The three passes the scripts made before collapse_duplicates: duplicated, groupby on the duplicates, drop_duplicates
+    # The old groupby dropped duplicates with a missing key, dropna=False keeps them like drop_duplicates does for single lines
+    duplicates = df[df.duplicated(subset=keys, keep=False)]
+    duplicates_grouped = duplicates.groupby(keys, dropna=False).agg({value: 'sum'}).reset_index()
+    df_cleaned = df.drop_duplicates(subset=keys, keep=False)
+    return pd.concat([df_cleaned, duplicates_grouped], ignore_index=True)
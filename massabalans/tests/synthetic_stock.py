@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+
+def make_stock_snapshots(combinations: int, seed: int = 0, missing: float = 0.05, without_batch: float = 0.02) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Start and end snapshot over the same Product/Batch combinations, like the stock table on two dates
+    # A share of the combinations is only in one of the two, and some products have no batch
+    rng = np.random.default_rng(seed)
+    products = rng.integers(0, max(combinations // 50, 1), combinations)
+    stock = pd.DataFrame({
+        'Product': pd.Series(products).map('P{:05d}'.format),
+        'Batch': pd.Series(np.arange(combinations)).map('B{:06d}'.format).where(rng.random(combinations) >= without_batch),
+    })
+    side = rng.random(combinations)
+    starting_stock = stock[side >= missing].assign(Aantal=lambda df: rng.integers(0, 1000, len(df)))
+    end_stock = stock[(side < missing) | (side >= 2 * missing)].assign(Aantal=lambda df: rng.integers(0, 1000, len(df)))
+    return starting_stock.reset_index(drop=True), end_stock.reset_index(drop=True)
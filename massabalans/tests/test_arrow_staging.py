@@ -0,0 +1,45 @@
+import pandas as pd
+import pyarrow as pa
+from arrow_staging import SALES_LINES_SCHEMA, table_types, target_select_sql, to_arrow
+from fake_bigquery import FakeBigQueryClient
+
+DATE_COLUMNS = ('Besteldatum', 'Verzenddatum', 'THT_Datum')
+
+def test_integral_numbers_are_staged_as_their_text():
+    df = pd.DataFrame({'OrderNummer': [1001.0, None], 'SKU': [8719326399355, 8719326399355], 'Batch': ['A1', 1234.0]})
+    table = to_arrow(df, SALES_LINES_SCHEMA)
+
+    assert table.column('OrderNummer').to_pylist() == ['1001', None]
+    assert table.column('SKU').to_pylist() == ['8719326399355', '8719326399355']
+    assert table.column('Batch').to_pylist() == ['A1', '1234']
+    assert table.schema.field('SKU').type == pa.dictionary(pa.int32(), pa.string())
+
+def test_new_target_gets_dates_as_text():
+    sql = target_select_sql('p.d.staging', SALES_LINES_SCHEMA, {}, DATE_COLUMNS, ('THT_Datum',))
+    assert "FORMAT_DATE('%Y-%m-%d', Besteldatum) AS Besteldatum" in sql
+    assert "IFNULL(FORMAT_DATE('%Y-%m-%d', THT_Datum), '') AS THT_Datum" in sql
+    assert 'CAST' not in sql
+
+def test_columns_are_cast_to_the_types_of_an_existing_target():
+    # A table that pandas_gbq created from inferred types
+    client = FakeBigQueryClient(tables={'p.d.sales': {
+        'OrderNummer': 'INTEGER', 'Besteldatum': 'STRING', 'Verzenddatum': 'STRING', 'SKU': 'INTEGER',
+        'Omschrijving': 'STRING', 'Aantal': 'FLOAT', 'Batch': 'STRING', 'THT_Datum': 'DATE', 'Orderstatus': 'STRING'}})
+    types = table_types(client, 'p.d.sales')
+    sql = target_select_sql('p.d.staging', SALES_LINES_SCHEMA, types, DATE_COLUMNS, ('THT_Datum',))
+
+    assert types['OrderNummer'] == 'INT64'
+    assert 'CAST(OrderNummer AS INT64) AS OrderNummer' in sql
+    assert 'CAST(SKU AS INT64) AS SKU' in sql
+    assert 'CAST(Aantal AS FLOAT64) AS Aantal' in sql
+    assert "FORMAT_DATE('%Y-%m-%d', Verzenddatum) AS Verzenddatum" in sql
+    # The target has THT_Datum as DATE already, so it is left alone
+    assert 'THT_Datum)' not in sql
+    assert 'Batch' not in sql
+
+def test_missing_target_has_no_types():
+    assert table_types(FakeBigQueryClient(), 'p.d.nieuw') == {}
+
+def test_nothing_to_convert_selects_everything():
+    schema = pa.schema([('order_id', pa.string()), ('quantity', pa.int64())])
+    assert target_select_sql('p.d.staging', schema, {'order_id': 'STRING', 'quantity': 'INT64'}) == "SELECT * FROM `p.d.staging`"
@@ -0,0 +1,77 @@
+import os
+import pandas as pd
+import pytest
+import report_pipeline
+from batch_ingest import IngestLedger, ingest_folder
+from synthetic_reports import make_report_folder, write_report_file
+
+DAYS = ['2024-06-01', '2024-06-02', '2024-06-03']
+
+@pytest.fixture
+def written(monkeypatch):
+    # Frames that reach the Sheets sink, per report prefix
+    written = {}
+    monkeypatch.setitem(report_pipeline.SINKS, 'sheets', lambda spec, df: written.setdefault(spec.file_prefix, []).append(df))
+    return written
+
+def ledger(tmp_path, name: str = 'ledger') -> IngestLedger:
+    return IngestLedger(str(tmp_path / f'{name}.json'), str(tmp_path / f'{name}_cache'))
+
+def fresh_result(tmp_path, folder: str, written: dict) -> pd.DataFrame:
+    # What a run with an empty ledger uploads for the same folder
+    ingest_folder(folder, ledger(tmp_path, 'fresh'), ['inbound'], max_workers=2)
+    return written['Inbound'].pop()
+
+def test_first_run_ingests_everything_and_the_rerun_nothing(tmp_path, written):
+    folder = str(tmp_path / 'reports')
+    make_report_folder(folder, DAYS, ['inbound', 'sales', 'returns'])
+    batch_ledger = ledger(tmp_path)
+
+    assert ingest_folder(folder, batch_ledger, max_workers=2) == {'inbound': 3, 'sales': 3, 'returns': 3}
+    assert {prefix: len(frames) for prefix, frames in written.items()} == {'Inbound': 1, 'Sales': 1, 'Returns': 1}
+
+    written.clear()
+    assert ingest_folder(folder, batch_ledger, max_workers=2) == {'inbound': 0, 'sales': 0, 'returns': 0}
+    assert written == {}
+
+def test_added_file_is_parsed_on_its_own(tmp_path, written, monkeypatch):
+    folder = str(tmp_path / 'reports')
+    make_report_folder(folder, DAYS, ['inbound'])
+    batch_ledger = ledger(tmp_path)
+    ingest_folder(folder, batch_ledger, ['inbound'], max_workers=2)
+
+    parsed = []
+    parse_reports = report_pipeline.parse_reports
+    monkeypatch.setattr('batch_ingest.parse_reports', lambda spec, paths, max_workers: parsed.append(paths) or parse_reports(spec, paths, max_workers))
+    write_report_file(os.path.join(folder, 'Inbound 2024-06-04.xlsx'), 'inbound', seed=4)
+
+    assert ingest_folder(folder, batch_ledger, ['inbound'], max_workers=2) == {'inbound': 1}
+    assert [[os.path.basename(path) for path in paths] for paths in parsed] == [['Inbound 2024-06-04.xlsx']]
+    pd.testing.assert_frame_equal(written['Inbound'][-1], fresh_result(tmp_path, folder, written))
+
+def test_changed_file_of_a_date_replaces_its_result(tmp_path, written):
+    folder = str(tmp_path / 'reports')
+    make_report_folder(folder, DAYS, ['inbound'])
+    batch_ledger = ledger(tmp_path)
+    ingest_folder(folder, batch_ledger, ['inbound'], max_workers=2)
+    old_digest = batch_ledger.processed('inbound')['2024-06-02']['digest']
+
+    # The report of the 2nd is downloaded again with other lines
+    write_report_file(os.path.join(folder, 'Inbound 2024-06-02.xlsx'), 'inbound', seed=9)
+
+    assert ingest_folder(folder, batch_ledger, ['inbound'], max_workers=2) == {'inbound': 1}
+    assert set(batch_ledger.processed('inbound')) == set(DAYS)
+    assert not os.path.exists(batch_ledger.result_path(old_digest))
+    pd.testing.assert_frame_equal(written['Inbound'][-1], fresh_result(tmp_path, folder, written))
+
+def test_result_of_a_removed_file_is_dropped(tmp_path, written):
+    folder = str(tmp_path / 'reports')
+    make_report_folder(folder, DAYS, ['inbound'])
+    batch_ledger = ledger(tmp_path)
+    ingest_folder(folder, batch_ledger, ['inbound'], max_workers=2)
+
+    os.remove(os.path.join(folder, 'Inbound 2024-06-01.xlsx'))
+
+    assert ingest_folder(folder, batch_ledger, ['inbound'], max_workers=2) == {'inbound': 0}
+    assert set(batch_ledger.processed('inbound')) == set(DAYS[1:])
+    pd.testing.assert_frame_equal(written['Inbound'][-1], fresh_result(tmp_path, folder, written))
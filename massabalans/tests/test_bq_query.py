@@ -0,0 +1,60 @@
+import re
+from datetime import date, datetime
+import pandas as pd
+import pytest
+from bq_query import QueryBudgetExceeded, cache_key, query_parameters, run_query
+from fake_bigquery import FakeBigQueryClient
+from stock_overview import stock_mutation_query, stock_snapshot_query
+
+TABLE = 'project.dataset.stock'
+
+def test_parameters_are_typed():
+    params = query_parameters({'day': date(2024, 4, 1), 'moment': datetime(2024, 4, 1, 12), 'count': 3, 'flag': True, 'name': 'x'})
+    assert {param.name: param.type_ for param in params} == {'day': 'DATE', 'moment': 'TIMESTAMP', 'count': 'INT64', 'flag': 'BOOL', 'name': 'STRING'}
+
+@pytest.mark.parametrize('sql', [stock_snapshot_query(TABLE), stock_mutation_query(TABLE)])
+def test_stock_queries_filter_on_a_prunable_timestamp_range(sql):
+    # No dates in the SQL text and no function around Timestamp in the filter
+    assert not re.search(r'\d{4}-\d{2}-\d{2}', sql)
+    assert 'DATE(Timestamp)' not in sql
+    assert re.search(r'Timestamp >= TIMESTAMP\(@\w+\)', sql)
+    assert re.search(r'Timestamp < TIMESTAMP\(DATE_ADD\(@\w+, INTERVAL 1 DAY\)\)', sql)
+
+def test_query_over_budget_is_refused_after_the_dry_run():
+    client = FakeBigQueryClient(bytes_per_query=5000)
+    with pytest.raises(QueryBudgetExceeded):
+        run_query(client, stock_snapshot_query(TABLE), {'date': date(2024, 4, 1)}, max_bytes=1000)
+
+    assert [query['dry_run'] for query in client.queries] == [True]
+
+def test_query_within_budget_runs_with_the_same_limit():
+    client = FakeBigQueryClient(lambda sql, params: pd.DataFrame({'Aantal': [1]}), bytes_per_query=500)
+    result = run_query(client, stock_snapshot_query(TABLE), {'date': date(2024, 4, 1)}, max_bytes=1000)
+
+    assert result['Aantal'].tolist() == [1]
+    dry_run, real = client.queries
+    assert dry_run['dry_run'] and not real['dry_run']
+    assert real['params'] == {'date': date(2024, 4, 1)}
+    assert real['types'] == {'date': 'DATE'}
+    assert real['maximum_bytes_billed'] == 1000
+
+def test_query_without_budget_sets_no_limit():
+    client = FakeBigQueryClient(bytes_per_query=500)
+    run_query(client, stock_snapshot_query(TABLE), {'date': date(2024, 4, 1)})
+    assert client.executed()[0]['maximum_bytes_billed'] is None
+
+def test_cached_result_does_not_touch_bigquery(tmp_path):
+    client = FakeBigQueryClient(lambda sql, params: pd.DataFrame({'Aantal': [1, 2]}))
+    params = {'start_date': date(2024, 4, 1), 'end_date': date(2024, 4, 7)}
+    first = run_query(client, stock_mutation_query(TABLE), params, cache_dir=str(tmp_path))
+    client.queries.clear()
+    second = run_query(client, stock_mutation_query(TABLE), params, cache_dir=str(tmp_path))
+
+    assert client.queries == []
+    pd.testing.assert_frame_equal(first, second)
+
+def test_cache_key_depends_on_parameter_values_and_types():
+    sql = stock_snapshot_query(TABLE)
+    assert cache_key(sql, {'date': date(2024, 4, 1)}) == cache_key(' '.join(sql.split()), {'date': date(2024, 4, 1)})
+    assert cache_key(sql, {'date': date(2024, 4, 1)}) != cache_key(sql, {'date': date(2024, 4, 2)})
+    assert cache_key(sql, {'date': date(2024, 4, 1)}) != cache_key(sql, {'date': '2024-04-01'})
@@ -0,0 +1,68 @@
+from datetime import date
+import pandas as pd
+import pytest
+from arrow_staging import SALES_LINES_SCHEMA, SALES_LINE_KEYS, SALES_LINE_UPDATES
+from bq_upsert import replace_frame, upsert_frame
+from fake_bigquery import FakeBigQueryClient
+from report_pipeline import REPORT_SPECS, aggregate
+
+TABLE = 'project.dataset.sales_lines'
+
+def sales_lines() -> pd.DataFrame:
+    # Two lines of order 1001 share order, SKU, batch and THT but differ in status and shipping date
+    return pd.DataFrame({
+        'OrderNummer': ['1001', '1001', '1002'],
+        'Besteldatum': [date(2024, 6, 1)] * 3,
+        'Verzenddatum': [date(2024, 6, 2), None, date(2024, 6, 3)],
+        'SKU': ['8719326399355'] * 3,
+        'Omschrijving': ['Kombucha', 'Kombucha 2', 'Kombucha'],
+        'Aantal': [2, 3, 1],
+        'Batch': ['B1', 'B1', 'B2'],
+        'THT_Datum': [date(2025, 1, 1), date(2025, 1, 1), None],
+        'Orderstatus': ['Verzonden', 'Queued', 'Verzonden'],
+    })
+
+def upsert(client: FakeBigQueryClient, df: pd.DataFrame, tmp_path) -> int:
+    return upsert_frame(client, df, SALES_LINES_SCHEMA, TABLE, SALES_LINE_KEYS, str(tmp_path), update_columns=SALES_LINE_UPDATES,
+                        date_columns=('Besteldatum', 'Verzenddatum', 'THT_Datum'), blank_columns=('THT_Datum',))
+
+def test_sales_lines_are_collapsed_on_the_merge_key():
+    collapsed = aggregate(REPORT_SPECS['sales_lines'], sales_lines())
+
+    assert not collapsed.duplicated(subset=SALES_LINE_KEYS).any()
+    assert collapsed['Aantal'].tolist() == [5, 1]
+    # The other columns come from the first line
+    assert collapsed.loc[0, 'Orderstatus'] == 'Verzonden'
+    assert collapsed.loc[0, 'Verzenddatum'] == date(2024, 6, 2)
+    assert list(collapsed.columns) == list(sales_lines().columns)
+
+def test_collapsed_lines_are_upserted_in_one_merge(tmp_path):
+    client = FakeBigQueryClient()
+    upsert(client, aggregate(REPORT_SPECS['sales_lines'], sales_lines()), tmp_path)
+
+    create, merge = [query['sql'] for query in client.executed()]
+    assert create.startswith(f"CREATE TABLE IF NOT EXISTS `{TABLE}`")
+    assert f"MERGE INTO `{TABLE}`" in merge
+    assert all(f"target.{key} IS NOT DISTINCT FROM source.{key}" in merge for key in SALES_LINE_KEYS)
+    # The staging table is gone, and so is its Parquet file
+    staging_id, = client.deleted
+    assert staging_id not in client.tables
+    assert list(tmp_path.iterdir()) == []
+
+def test_duplicate_merge_keys_are_refused_before_anything_is_loaded(tmp_path):
+    client = FakeBigQueryClient()
+    with pytest.raises(ValueError):
+        upsert(client, sales_lines(), tmp_path)
+
+    assert client.rows == {} and client.queries == []
+
+def test_replace_rewrites_the_whole_table(tmp_path):
+    client = FakeBigQueryClient(tables={TABLE: {'OrderNummer': 'INT64'}})
+    replace_frame(client, sales_lines(), SALES_LINES_SCHEMA, TABLE, str(tmp_path),
+                  date_columns=('Besteldatum', 'Verzenddatum', 'THT_Datum'), blank_columns=('THT_Datum',))
+
+    replace, = [query['sql'] for query in client.executed()]
+    assert replace.startswith(f"CREATE OR REPLACE TABLE `{TABLE}` AS SELECT * REPLACE (")
+    # The existing target keeps its column type
+    assert 'CAST(OrderNummer AS INT64) AS OrderNummer' in replace
+    assert len(client.deleted) == 1
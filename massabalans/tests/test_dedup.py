@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dedup import collapse_duplicates
+from synthetic_sales import LEGACY_DUPLICATE_KEYS, legacy_collapse, make_sales_lines
+
+def sorted_lines(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(list(df.columns), na_position='first').reset_index(drop=True)
+
+@pytest.mark.parametrize('seed', range(50))
+def test_same_lines_as_the_legacy_logic(seed):
+    rng = np.random.default_rng(seed)
+    rows = int(rng.integers(1, 400))
+    df = make_sales_lines(rows, seed, orders=int(rng.integers(1, rows + 1)), skus=int(rng.integers(1, 6)), missing=float(rng.random() / 2))
+
+    collapsed = collapse_duplicates(df, LEGACY_DUPLICATE_KEYS)
+
+    pd.testing.assert_frame_equal(sorted_lines(collapsed), sorted_lines(legacy_collapse(df, LEGACY_DUPLICATE_KEYS)), check_dtype=False)
+    assert collapsed['Aantal'].sum() == df['Aantal'].sum()
+
+def test_lines_keep_the_order_of_their_first_occurrence():
+    df = pd.DataFrame({'SKU': ['b', 'a', 'b', 'c'], 'Aantal': [1, 2, 3, 4]})
+    assert collapse_duplicates(df, ['SKU']).to_dict('list') == {'SKU': ['b', 'a', 'c'], 'Aantal': [4, 2, 4]}
+
+def test_missing_aantal_stays_missing():
+    df = pd.DataFrame({'SKU': ['a', 'a', 'b'], 'Aantal': [None, None, 1.0]})
+    collapsed = collapse_duplicates(df, ['SKU'])
+    assert collapsed['Aantal'].isna().tolist() == [True, False]
+
+def test_other_columns_come_from_the_first_line_as_a_whole():
+    df = pd.DataFrame({'SKU': ['a', 'a'], 'Status': [None, 'Queued'], 'Datum': ['2024-06-01', None], 'Aantal': [1, 2]})
+    collapsed = collapse_duplicates(df, ['SKU'])
+    assert collapsed['Status'].isna().all() and collapsed['Datum'].tolist() == ['2024-06-01']
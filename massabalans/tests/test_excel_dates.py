@@ -0,0 +1,32 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from excel_dates import excel_to_date
+
+def dates(*values) -> list:
+    return [None if pd.isna(value) else value.strftime('%Y-%m-%d') for value in values]
+
+def test_serials_become_midnight_dates():
+    converted = excel_to_date(pd.Series([45444, 45444.75, 1]))
+    assert dates(*converted) == ['2024-06-01', '2024-06-01', '1899-12-31']
+    assert (converted.dt.normalize() == converted).all()
+
+def test_missing_values_become_nat():
+    assert excel_to_date(pd.Series([np.nan, None, 45444], dtype=object)).isna().tolist() == [True, True, False]
+    assert excel_to_date(pd.Series([np.nan, np.nan])).isna().all()
+
+def test_numeric_strings_are_serials():
+    assert dates(*excel_to_date(pd.Series(['45444', '45445.5']))) == ['2024-06-01', '2024-06-02']
+
+def test_real_datetimes_lose_their_time():
+    converted = excel_to_date(pd.Series([datetime(2024, 6, 3, 15, 30), 45444], dtype=object))
+    assert dates(*converted) == ['2024-06-03', '2024-06-01']
+    assert dates(*excel_to_date(pd.Series(pd.to_datetime(['2024-06-03 15:30'])))) == ['2024-06-03']
+
+def test_date_strings_are_parsed():
+    assert dates(*excel_to_date(pd.Series(['2024-06-04', '2024-06-05 10:00:00', 45444], dtype=object))) == [
+        '2024-06-04', '2024-06-05', '2024-06-01']
+
+def test_junk_becomes_nat():
+    converted = excel_to_date(pd.Series(['onzin', '', 'n.v.t.', 45444], dtype=object))
+    assert converted.isna().tolist() == [True, True, True, False]
@@ -0,0 +1,113 @@
+from datetime import date, datetime, timedelta
+import pandas as pd
+import pytest
+import retrieve_order_ids_monta
+import retrieve_order_info_monta as orders
+from checkpoint_store import CheckpointStore
+from monta_client import MontaClient
+from stub_monta import StubMonta, make_order
+
+# Twelve orders over three days, 9 and 10 share a timestamp so only a numeric comparison orders them right
+FIXTURE_ORDERS = [make_order(order_id, f'2024-04-0{1 + (order_id - 1) // 5}T10:{min(order_id, 9):02d}:00') for order_id in range(1, 13)]
+
+class Loader:
+    # Stands in for transfer_data_to_bigquery, fail_on makes the n-th chunk raise like a crashed upload
+    def __init__(self, fail_on: int = None):
+        self.chunks = []
+        self.fail_on = fail_on
+
+    def __call__(self, df: pd.DataFrame) -> None:
+        if self.fail_on is not None and len(self.chunks) + 1 == self.fail_on:
+            raise RuntimeError("upload mislukt")
+        self.chunks.append(df)
+
+    def order_ids(self) -> list:
+        return [order_id for df in self.chunks for order_id in df['order_id']]
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    with StubMonta(FIXTURE_ORDERS) as stub:
+        client = MontaClient(stub.url, 'user', 'password', rate_limit=1000, max_retries=0)
+        monkeypatch.setattr(orders, 'monta_client', client)
+        monkeypatch.setattr(retrieve_order_ids_monta, 'monta_client', client)
+        monkeypatch.setattr(orders, 'checkpoint_store', CheckpointStore(str(tmp_path / 'checkpoint.json')))
+        yield stub
+
+def sync(monkeypatch, loader: Loader, chunk_size: int = 4) -> int:
+    monkeypatch.setattr(orders, 'transfer_data_to_bigquery', loader)
+    return orders.sync_orders_incremental('2024-04-30', '2024-04-01', page_size=5, chunk_size=chunk_size)
+
+def test_order_keys_compare_numeric_ids_as_numbers():
+    assert orders._order_key('2024-04-01', '9') < orders._order_key('2024-04-01', '10')
+    assert orders._order_key('2024-04-01', 10) == orders._order_key('2024-04-01', '10')
+    assert orders._order_key('2024-04-01', '99') < orders._order_key('2024-04-01', 'A1')
+
+def test_second_run_only_fetches_new_orders(stub, monkeypatch):
+    first = Loader()
+    assert sync(monkeypatch, first) == 12
+    assert first.order_ids() == list(range(1, 13))
+    assert orders.checkpoint_store.load(orders.checkpoint_name)['order_id'] == '12'
+
+    stub.requests.clear()
+    second = Loader()
+    assert sync(monkeypatch, second) == 0
+    assert not any(path.startswith('order/') for path in stub.requests)
+
+def test_failed_order_is_fetched_again_on_the_next_run(stub, monkeypatch):
+    stub.failures['order/6'] = [500]
+    first = Loader()
+    sync(monkeypatch, first)
+
+    # Everything after order 6 was loaded, but the checkpoint stays before it
+    assert 6 not in first.order_ids()
+    assert orders.checkpoint_store.load(orders.checkpoint_name)['order_id'] == '5'
+
+    second = Loader()
+    sync(monkeypatch, second)
+    assert second.order_ids() == list(range(6, 13))
+    assert orders.checkpoint_store.load(orders.checkpoint_name)['order_id'] == '12'
+
+def test_crash_resumes_after_the_last_completed_chunk(stub, monkeypatch):
+    with pytest.raises(RuntimeError):
+        sync(monkeypatch, Loader(fail_on=2))
+    assert orders.checkpoint_store.load(orders.checkpoint_name)['order_id'] == '4'
+
+    resumed = Loader()
+    sync(monkeypatch, resumed)
+    assert resumed.order_ids() == list(range(5, 13))
+
+def test_unshipped_order_is_fetched_again_once_it_has_batch_lines(monkeypatch, tmp_path):
+    # Orders of today, order 3 is not picked yet: no Shipped and no batch lines on the first run
+    today = date.today()
+    recent = [make_order(order_id, f'{today}T10:0{order_id}:00') for order_id in range(1, 6)]
+    recent[2]['Shipped'] = None
+    with StubMonta(recent) as stub:
+        stub.batches['3'] = {'BatchLines': []}
+        client = MontaClient(stub.url, 'user', 'password', rate_limit=1000, max_retries=0)
+        monkeypatch.setattr(orders, 'monta_client', client)
+        monkeypatch.setattr(retrieve_order_ids_monta, 'monta_client', client)
+        monkeypatch.setattr(orders, 'checkpoint_store', CheckpointStore(str(tmp_path / 'checkpoint.json')))
+        first = Loader()
+        monkeypatch.setattr(orders, 'transfer_data_to_bigquery', first)
+        tomorrow = str(today + timedelta(days=1))
+        orders.sync_orders_incremental(tomorrow, str(today), page_size=5, chunk_size=2)
+
+        # The orders after 3 are loaded, but the mark stays before it
+        assert first.order_ids() == [1, 2, 4, 5]
+        assert orders.checkpoint_store.load(orders.checkpoint_name)['order_id'] == '2'
+
+        # Order 3 has been picked and shipped
+        recent[2]['Shipped'] = f'{today}T15:00:00'
+        del stub.batches['3']
+        second = Loader()
+        monkeypatch.setattr(orders, 'transfer_data_to_bigquery', second)
+        orders.sync_orders_incremental(tomorrow, str(today), page_size=5, chunk_size=2)
+
+    assert second.order_ids() == [3, 4, 5]
+    assert orders.checkpoint_store.load(orders.checkpoint_name)['order_id'] == '5'
+
+def test_unshipped_order_older_than_the_settle_window_does_not_hold_the_mark():
+    old = make_order(1, '2024-04-01T10:00:00')
+    old['Shipped'] = None
+    assert orders.is_settled(old)
+    assert not orders.is_settled({**old, 'Received': datetime.now().isoformat(timespec='seconds')})
@@ -0,0 +1,37 @@
+import pandas as pd
+from mass_balance import SOURCES, normalise, reconcile
+
+CITROEN = 'citroen-kombucha-12x250'
+
+def source(product: str, batches: list, quantities: list) -> pd.DataFrame:
+    return normalise(pd.DataFrame({'SKU': [product] * len(batches), 'Batch': batches, 'Aantal': quantities}), 'SKU', 'Batch', 'Aantal')
+
+def test_each_source_counts_with_its_sign():
+    sources = {name: source('8719326399355', ['B1'], [quantity]) for name, quantity in zip(SOURCES, [1, 10, 100, 1000, 10000])}
+    balance = reconcile(sources)
+    # 1 + 10 - 100 + 1000 - 10000
+    assert balance.to_dict('records') == [{'Product': CITROEN, 'Batch': 'B1', 'Begin': 1, 'Inbound': 10, 'Verkoop': 100,
+                                           'Retour': 1000, 'Eind': 10000, 'Verschil': -9089}]
+
+def test_batch_missing_from_a_source_counts_as_zero():
+    balance = reconcile({
+        'Begin': source('8719326399355', ['B1', 'B2'], [5, 7]),
+        'Inbound': source('8719326399355', ['B3'], [4]),
+        'Verkoop': source('8719326399355', ['B1'], [5]),
+        'Eind': source('8719326399355', ['B2', 'B3'], [7, 4]),
+    })
+    assert balance[['Batch'] + SOURCES + ['Verschil']].values.tolist() == [
+        ['B1', 5, 0, 5, 0, 0, 0],
+        ['B2', 7, 0, 0, 0, 7, 0],
+        ['B3', 0, 4, 0, 0, 4, 0],
+    ]
+
+def test_batch_number_as_int_float_or_text_is_one_batch():
+    balance = reconcile({
+        'Begin': source('8719326399355', [1234], [10]),
+        'Inbound': source('8719326399355', [1234.0, None], [5, 3]),
+        'Verkoop': source('8719326399355', ['1234'], [6]),
+        'Retour': source('8719326399355', pd.Series([1234.0, ' 1234 '], dtype=object), [1, 1]),
+        'Eind': source(' 8719326399355.0', ['1234'], [11]),
+    })
+    assert balance[['Product', 'Batch', 'Verschil']].values.tolist() == [[CITROEN, '', 3], [CITROEN, '1234', 0]]
@@ -0,0 +1,57 @@
+import base64
+from monta_client import MontaClient
+from stub_monta import StubMonta, make_order
+
+def test_requests_reuse_one_pooled_connection():
+    with StubMonta([make_order(1, '2024-04-01T10:00:00')]) as stub:
+        with MontaClient(stub.url, 'user', 'password', rate_limit=1000) as client:
+            for _ in range(20):
+                assert client.get('order/1').status_code == 200
+
+        assert stub.requests['order/1'] == 20
+        assert stub.connections == 1
+
+def test_auth_and_compression_headers_are_sent():
+    with StubMonta([make_order(1, '2024-04-01T10:00:00')]) as stub:
+        with MontaClient(stub.url, 'user', 'password') as client:
+            response = client.get('order/1')
+
+    headers = response.request.headers
+    assert headers['Authorization'] == 'Basic ' + base64.b64encode(b'user:password').decode()
+    assert 'gzip' in headers['Accept-Encoding']
+    assert response.json()['WebshopOrderId'] == 1
+
+def test_bytes_are_counted_as_they_are_read():
+    with StubMonta([make_order(1, '2024-04-01T10:00:00')], reports={'1': b'x' * 300_000}) as stub:
+        with MontaClient(stub.url, 'user', 'password', rate_limit=1000) as client:
+            response = client.get('order/1')
+            assert client.snapshot_stats()['bytes'] == len(response.content)
+
+            # A stream only counts the blocks that were read
+            streamed = client.get('reports/1/file', stream=True)
+            assert client.snapshot_stats()['bytes'] == len(response.content)
+            read = sum(len(block) for block in streamed.iter_content(64 * 1024))
+            assert read == 300_000
+            assert client.snapshot_stats()['bytes'] == len(response.content) + read
+
+def test_run_metrics_are_only_written_or_printed_when_asked(monkeypatch, tmp_path, capsys):
+    import run_metrics
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(run_metrics, '_run_metrics', None)
+    metrics = run_metrics.get_run_metrics()
+    with metrics.stage('test'):
+        pass
+    metrics.emit()
+
+    assert metrics.path is None
+    assert list(tmp_path.iterdir()) == []
+    assert capsys.readouterr().out == ''
+
+    monkeypatch.setenv('METRICS_PRINT', '1')
+    monkeypatch.setattr(run_metrics, '_run_metrics', None)
+    metrics = run_metrics.get_run_metrics()
+    with metrics.stage('test', rows=3):
+        pass
+    metrics.emit()
+
+    assert '] test: 0.00s (rows 3, ' in capsys.readouterr().out
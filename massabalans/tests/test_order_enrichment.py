@@ -0,0 +1,35 @@
+import pytest
+import retrieve_order_info_monta as orders
+from monta_client import MontaClient
+from stub_monta import StubMonta, make_order
+
+@pytest.fixture
+def stub(monkeypatch):
+    fixture_orders = [make_order(order_id, f'2024-04-{1 + order_id % 28:02d}T10:00:00') for order_id in range(1, 41)]
+    with StubMonta(fixture_orders, latency=0.02) as stub:
+        monkeypatch.setattr(orders, 'monta_client', MontaClient(stub.url, 'user', 'password', rate_limit=1000))
+        yield stub
+
+def test_results_keep_the_order_of_the_ids(stub):
+    order_ids = [order['WebshopOrderId'] for order in stub.orders]
+    results = list(orders.fetch_order_details(iter(order_ids), max_workers=8))
+
+    assert [order_id for order_id, _, _ in results] == order_ids
+    assert all(order['WebshopOrderId'] == order_id for order_id, order, _ in results)
+    assert all(batches['BatchLines'] for _, _, batches in results)
+
+def test_orders_and_batches_are_fetched_concurrently_within_the_limit(stub):
+    order_ids = [order['WebshopOrderId'] for order in stub.orders]
+    list(orders.fetch_order_details(order_ids, max_workers=8))
+
+    # Both calls of an order overlap, and no more than max_workers orders are in flight
+    assert 2 < stub.max_in_flight <= 16
+    assert stub.requests['order/1'] == 1
+    assert stub.requests['order/1/batches'] == 1
+
+def test_failed_orders_are_left_out_of_the_dataframe(stub):
+    stub.failures['order/7'] = [404]
+    df = orders.create_order_dataframe([order['WebshopOrderId'] for order in stub.orders], max_workers=4)
+
+    assert sorted(df['order_id']) == [order_id for order_id in range(1, 41) if order_id != 7]
+    assert df['product_name'].notna().all()
@@ -0,0 +1,65 @@
+import time
+import pytest
+import retrieve_order_ids_monta
+from monta_client import MontaClient
+from retrieve_order_ids_monta import iter_order_ids, iter_order_pages
+from stub_monta import StubMonta, make_order
+
+def orders(count: int) -> list[dict]:
+    return [make_order(order_id, '2024-04-01T10:00:00') for order_id in range(1, count + 1)]
+
+@pytest.fixture
+def stub_with(monkeypatch):
+    stubs = []
+
+    def start(count: int, latency: float = 0.0) -> StubMonta:
+        stub = StubMonta(orders(count), latency=latency).__enter__()
+        stubs.append(stub)
+        monkeypatch.setattr(retrieve_order_ids_monta, 'monta_client', MontaClient(stub.url, 'user', 'password', rate_limit=1000, max_retries=0))
+        return stub
+    yield start
+    for stub in stubs:
+        stub.__exit__(None, None, None)
+
+def page_ids(pages: list[list[dict]]) -> list[list[int]]:
+    return [[order['WebshopOrderId'] for order in page] for page in pages]
+
+def test_pages_come_back_in_page_order(stub_with):
+    # Later pages are answered first by the latency of the stub, they are still yielded in order
+    stub_with(23, latency=0.01)
+    pages = list(iter_order_pages('2024-04-01', '2024-04-02', page_size=5, prefetch=4))
+    assert page_ids(pages) == [list(range(start, min(start + 5, 24))) for start in range(1, 24, 5)]
+
+def test_stops_at_a_short_page_without_requesting_pages_after_it(stub_with):
+    stub = stub_with(12)
+    pages = list(iter_order_pages('2024-04-01', '2024-04-02', page_size=5, prefetch=1))
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert stub.order_pages == [0, 1, 2]
+
+def test_stops_at_an_empty_page(stub_with):
+    stub = stub_with(10)
+    pages = list(iter_order_pages('2024-04-01', '2024-04-02', page_size=5, prefetch=1))
+    assert [len(page) for page in pages] == [5, 5]
+    assert stub.order_pages == [0, 1, 2]
+
+def test_no_page_is_requested_after_the_stop(stub_with):
+    # Pages already in flight may run past the last page, at most prefetch - 1 of them,
+    # but nothing new is asked for once the short page has arrived
+    stub = stub_with(7)
+    pages = list(iter_order_pages('2024-04-01', '2024-04-02', page_size=5, prefetch=3))
+    assert [len(page) for page in pages] == [5, 2]
+    # Requests that were in flight at the stop may still arrive at the server
+    time.sleep(0.2)
+    assert sorted(stub.order_pages) == sorted(set(stub.order_pages))
+    assert max(stub.order_pages) <= 1 + 3 - 1
+
+def test_failed_page_ends_the_stream(stub_with):
+    stub = stub_with(20)
+    stub.failed_pages.add(1)
+    pages = list(iter_order_pages('2024-04-01', '2024-04-02', page_size=5, prefetch=2))
+    assert page_ids(pages) == [[1, 2, 3, 4, 5]]
+    assert max(stub.order_pages) <= 2
+
+def test_order_ids_stop_at_max_orders(stub_with):
+    stub_with(12)
+    assert list(iter_order_ids('2024-04-01', '2024-04-02', page_size=5, max_orders=7, prefetch=2)) == list(range(1, 8))
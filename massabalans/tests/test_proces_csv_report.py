@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+from arrow_staging import SALES_LINE_KEYS
+from dedup import collapse_duplicates
+from excel_dates import excel_to_date
+from proces_csv_report import csv_columns, csv_dtypes, read_sales_lines
+from synthetic_sales import make_sales_lines
+
+def write_csv_export(path, rows: int) -> None:
+    # Synthetic sales lines in the layout of the Monta CSV export, dates as Excel serials
+    df = make_sales_lines(rows, orders=rows // 8)
+    for column in ['Besteldatum', 'Verzenddatum', 'THT_Datum']:
+        df[column] = (df[column] - pd.Timestamp('1899-12-30')).dt.days.astype('Int64')
+    df = df.rename(columns={name: column for column, name in csv_columns.items()})
+    df.assign(Klant='Webshop').to_csv(path, index=False)
+
+@pytest.mark.parametrize('chunk_rows', [7, 250, 1000])
+def test_chunked_read_matches_collapsing_the_whole_file(tmp_path, chunk_rows):
+    path = tmp_path / 'report_file.csv'
+    write_csv_export(path, 2000)
+
+    chunked = read_sales_lines(str(path), chunk_rows=chunk_rows)
+    # The whole file at once, collapsed in one go
+    whole = pd.read_csv(path, usecols=list(csv_columns), dtype=csv_dtypes).rename(columns=csv_columns)
+    for column in ['Besteldatum', 'Verzenddatum', 'THT_Datum']:
+        whole[column] = excel_to_date(whole[column])
+    whole = collapse_duplicates(whole, SALES_LINE_KEYS)
+
+    assert len(chunked) < 2000
+    pd.testing.assert_frame_equal(chunked.sort_values(SALES_LINE_KEYS, ignore_index=True),
+                                  whole.sort_values(SALES_LINE_KEYS, ignore_index=True))
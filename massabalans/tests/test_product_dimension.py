@@ -0,0 +1,42 @@
+import json
+import pandas as pd
+import pytest
+from product_dimension import DATA_VERSION, ProductDimension
+
+WATERKEFIR = 'waterkefir-original-4x1l'
+CITROEN = 'citroen-kombucha-12x250'
+
+@pytest.fixture(scope='module')
+def products() -> ProductDimension:
+    return ProductDimension.load()
+
+def write_products(path, products: list[dict], version: int = DATA_VERSION) -> str:
+    path.write_text(json.dumps({'version': version, 'products': products}))
+    return str(path)
+
+def test_description_spellings_fold_to_one_product(products):
+    values = pd.Series(['Waterkefir Original 4X 1L', 'Waterkefir Original 4x 1L', '  waterkefir  original 4x\t1l ', 'Bulk levende Gember'])
+    assert products.lookup(values).tolist() == [WATERKEFIR, WATERKEFIR, WATERKEFIR, 'bulk-gember']
+
+def test_ean_read_as_float_matches(products):
+    # Excel and CSV exports give the EAN as a float, or as its text with '.0'
+    assert products.lookup(pd.Series(['8719326399355.0', '8719326399355'])).tolist() == [CITROEN, CITROEN]
+    assert products.lookup(pd.Series([8719326399355.0, None])).tolist()[0] == CITROEN
+    assert products.lookup(pd.Series([8719326399355.0, 'Bulk Waterkefir'], dtype=object)).tolist() == [CITROEN, 'bulk-waterkefir']
+
+def test_key_of_two_products_is_refused_at_load(tmp_path):
+    path = write_products(tmp_path / 'products.json', [
+        {'id': 'a', 'name': 'Product A', 'eans': ['123']},
+        {'id': 'b', 'name': 'Product B', 'descriptions': ['product a']},
+    ])
+    with pytest.raises(ValueError, match='product a'):
+        ProductDimension.load(path)
+
+def test_other_data_version_is_refused(tmp_path):
+    path = write_products(tmp_path / 'products.json', [{'id': 'a', 'name': 'Product A'}], version=DATA_VERSION + 1)
+    with pytest.raises(ValueError, match='versie'):
+        ProductDimension.load(path)
+
+def test_unmatched_counts_unknown_values(products):
+    values = pd.Series(['8719326399355', 'onbekend', 'Onbekend', None, '123', 'onbekend'])
+    assert products.unmatched(values).to_dict() == {'onbekend': 2, 'Onbekend': 1, '123': 1}
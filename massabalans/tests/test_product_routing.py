@@ -0,0 +1,52 @@
+import os
+import pandas as pd
+import pytest
+from product_routing import SHEET_NAMES, split_by_sheet
+from report_pipeline import REPORT_SPECS, parse_report
+
+OUD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'oud')
+
+# The masks sales_report used before the routing table, one per tab
+LEGACY_MASKS = {
+    'Probiotica': ('Omschrijving', 'Probiotica Ampullen 28x 9ml'),
+    'Kombucha': ('Omschrijving', 'Kombucha Original 4x 1L'),
+    'Bulk Kombucha': ('SKU', 'Bulk Kombucha'),
+    'Waterkefir': ('Omschrijving', 'Waterkefir Original 4X 1L'),
+    'Bulk Waterkefir': ('SKU', 'Bulk Waterkefir'),
+    'Mix': ('Omschrijving', 'Mix Originals 4x 1L'),
+    'Bloem': ('Omschrijving', 'Bloem Kombucha 12x 250ml'),
+    'Bulk Bloem': ('SKU', 'Bulk Bloem'),
+    'Citroen': ('Omschrijving', 'Citroen Kombucha 12x 250ml'),
+    'Bulk Citroen': ('SKU', 'Bulk Verse Citroen'),
+    'Gember': ('Omschrijving', 'Gember Limonade 12x 250ml'),
+    'Bulk Gember': ('SKU', 'Bulk levende Gember'),
+    'Frisdrank': ('Omschrijving', 'Frisdrank Mix 12x 250ml'),
+    'Starter Box': ('Omschrijving', 'Starter Box'),
+}
+
+@pytest.fixture(scope='module')
+def sales() -> pd.DataFrame:
+    df, _ = parse_report(REPORT_SPECS['sales'], os.path.join(OUD_DIR, 'Sales 2024-06-17.xlsx'))
+    return df
+
+def test_same_frames_as_the_legacy_masks_on_the_sales_fixture(sales):
+    routed = split_by_sheet(sales)
+
+    assert list(routed) == SHEET_NAMES
+    for sheet, (column, value) in LEGACY_MASKS.items():
+        pd.testing.assert_frame_equal(routed[sheet], sales[sales[column] == value], obj=sheet)
+
+def test_both_spellings_of_waterkefir_and_bulk_skus_are_routed():
+    df = pd.DataFrame({
+        'SKU': ['onbekend-1', 'onbekend-2', 'Bulk Waterkefir', 'Bulk levende Gember', 'onbekend-3'],
+        'Omschrijving': ['Waterkefir Original 4X 1L', 'Waterkefir Original 4x 1L', None, '', 'Iets anders'],
+        'Aantal': [1, 2, 3, 4, 5],
+    })
+    routed = split_by_sheet(df)
+
+    assert routed['Waterkefir']['Aantal'].tolist() == [1, 2]
+    assert routed['Bulk Waterkefir']['Aantal'].tolist() == [3]
+    assert routed['Bulk Gember']['Aantal'].tolist() == [4]
+    # Tabs without rows still get an empty frame, so their old data is cleared
+    assert routed['Kombucha'].empty and list(routed['Kombucha'].columns) == list(df.columns)
+    assert sum(len(frame) for frame in routed.values()) == 4
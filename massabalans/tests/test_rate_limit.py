@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from monta_client import MontaClient
+from rate_limit import TokenBucket, backoff_delay, parse_retry_after
+from stub_monta import StubMonta, make_order
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+    with pytest.raises(ValueError):
+        TokenBucket(-1)
+
+def test_retry_after_seconds_and_http_date():
+    assert parse_retry_after('2.5') == 2.5
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('later') is None
+    assert parse_retry_after(None) is None
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff_delay(10, base=0.5, cap=2.0) for _ in range(100)]
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+def test_throttled_calls_are_retried_instead_of_dropped():
+    with StubMonta([make_order(1, '2024-04-01T10:00:00')]) as stub:
+        stub.failures['order/1'] = [429, 503, 429]
+        with MontaClient(stub.url, 'user', 'password', max_retries=5) as client:
+            response = client.get('order/1')
+            stats = client.snapshot_stats()
+
+    assert response.status_code == 200
+    assert stub.requests['order/1'] == 4
+    assert stats['retries'] == 3
+
+def test_gives_up_after_max_retries():
+    with StubMonta([make_order(1, '2024-04-01T10:00:00')]) as stub:
+        stub.failures['order/1'] = [429] * 10
+        with MontaClient(stub.url, 'user', 'password', max_retries=2) as client:
+            assert client.get('order/1').status_code == 429
+    assert stub.requests['order/1'] == 3
+
+def test_shared_budget_stays_close_to_the_server_limit():
+    # 16 workers share one budget of 20 requests per second against a server that allows exactly that
+    rate = 20
+    with StubMonta([make_order(1, '2024-04-01T10:00:00')], rate_limit=rate) as stub:
+        with MontaClient(stub.url, 'user', 'password', rate_limit=rate) as client:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                statuses = list(executor.map(lambda _: client.get('order/1').status_code, range(60)))
+            seconds = time.perf_counter() - start
+
+    assert statuses == [200] * 60
+    # A full bucket at the start lets the first `rate` requests through at once
+    ideal = (60 - rate) / rate
+    assert seconds >= ideal * 0.9
+    assert seconds <= ideal * 1.5
+    assert stub.throttled <= 3
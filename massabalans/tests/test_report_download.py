@@ -0,0 +1,64 @@
+import hashlib
+import os
+from monta_client import MontaClient
+from report_download import download_report, download_reports
+from stub_monta import StubMonta
+
+REPORT = b'OrderNummer,Sku,Aantal\n' + b''.join(f'{order},8719326399355,{order % 5}\n'.encode() for order in range(2000))
+
+def test_report_is_downloaded_and_checked(tmp_path):
+    path = str(tmp_path / 'report_1.csv')
+    with StubMonta(reports={'1': REPORT}) as stub, MontaClient(stub.url, 'user', 'password', rate_limit=1000) as client:
+        assert download_report(client, '1', path, hashlib.sha256(REPORT).hexdigest()) == path
+
+    with open(path, 'rb') as file:
+        assert file.read() == REPORT
+    assert not os.path.exists(path + '.part')
+
+def test_partial_file_is_resumed_without_the_md5_of_the_part(tmp_path):
+    path = str(tmp_path / 'report_1.csv')
+    with open(path + '.part', 'wb') as file:
+        file.write(REPORT[:1000])
+
+    with StubMonta(reports={'1': REPORT}) as stub, MontaClient(stub.url, 'user', 'password', rate_limit=1000) as client:
+        assert download_report(client, '1', path, hashlib.sha256(REPORT).hexdigest()) == path
+
+    with open(path, 'rb') as file:
+        assert file.read() == REPORT
+
+def test_oversized_partial_file_is_downloaded_again(tmp_path):
+    path = str(tmp_path / 'report_1.csv')
+    with open(path + '.part', 'wb') as file:
+        file.write(REPORT + b'rest van een ander bestand')
+
+    with StubMonta(reports={'1': REPORT}) as stub, MontaClient(stub.url, 'user', 'password', rate_limit=1000) as client:
+        assert download_report(client, '1', path) == path
+
+    assert stub.requests['reports/1/file'] == 2
+    with open(path, 'rb') as file:
+        assert file.read() == REPORT
+
+def test_complete_partial_file_is_not_downloaded_again(tmp_path):
+    path = str(tmp_path / 'report_1.csv')
+    with open(path + '.part', 'wb') as file:
+        file.write(REPORT)
+
+    with StubMonta(reports={'1': REPORT}) as stub, MontaClient(stub.url, 'user', 'password', rate_limit=1000) as client:
+        assert download_report(client, '1', path) == path
+
+    assert stub.requests['reports/1/file'] == 1
+
+def test_unreachable_report_does_not_stop_the_others(tmp_path):
+    with StubMonta(reports={'1': REPORT}) as stub, MontaClient(stub.url, 'user', 'password', rate_limit=1000, max_retries=0) as client:
+        send = client._send
+
+        def broken(endpoint, url, **kwargs):
+            # The connection to report 2 keeps failing
+            if endpoint == 'reports/2/file':
+                return send(endpoint, 'http://127.0.0.1:1/', **kwargs)
+            return send(endpoint, url, **kwargs)
+        client._send = broken
+
+        paths = download_reports(client, [{'Id': '1'}, {'Id': '2'}], str(tmp_path), max_workers=2)
+
+    assert paths == {'1': os.path.join(str(tmp_path), 'report_1.csv'), '2': None}
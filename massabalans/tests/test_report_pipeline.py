@@ -0,0 +1,47 @@
+from dataclasses import replace
+from datetime import date
+import pandas as pd
+import report_pipeline
+from fake_bigquery import FakeBigQueryClient
+from report_pipeline import REPORT_SPECS, ReportSpec, aggregate, write_bigquery, write_report
+from stub_monta import FIXTURE_SKU
+
+def test_lines_are_collapsed_on_the_keys_of_the_spec():
+    spec = ReportSpec(file_prefix='Test', columns={}, keys=('SKU',))
+    df = pd.DataFrame({'SKU': ['a', 'a', 'b'], 'Batch': ['1', '2', '1'], 'Aantal': [1, 2, 3]})
+    assert aggregate(spec, df).to_dict('list') == {'SKU': ['a', 'b'], 'Batch': ['1', '1'], 'Aantal': [3, 3]}
+
+def test_write_report_leaves_the_parsed_frame_alone(monkeypatch):
+    written = []
+    monkeypatch.setitem(report_pipeline.SINKS, 'sheets', lambda spec, df: written.append(df))
+    parsed = pd.DataFrame({'SKU': [FIXTURE_SKU], 'Batch': ['B1'], 'Aantal': [4]})
+
+    df = write_report(REPORT_SPECS['inbound'], [parsed], {})
+
+    assert list(parsed.columns) == ['SKU', 'Batch', 'Aantal']
+    assert written[0] is df and df['Omschrijving'].iloc[0] != ''
+
+def test_unknown_skus_are_reported(monkeypatch, capsys):
+    monkeypatch.setitem(report_pipeline.SINKS, 'sheets', lambda spec, df: None)
+    parsed = pd.DataFrame({'SKU': [FIXTURE_SKU, '0000000000001', '0000000000002'], 'Batch': ['B1', 'B1', 'B2'], 'Aantal': [4, 1, 2]})
+
+    df = write_report(REPORT_SPECS['inbound'], [parsed], {})
+
+    assert "Onbekende SKU's: {'0000000000001': 1, '0000000000002': 1}" in capsys.readouterr().out
+    assert df['Omschrijving'].tolist()[1:] == ['', '']
+
+def test_bigquery_sink_takes_its_table_and_keys_from_the_spec(monkeypatch, tmp_path):
+    client = FakeBigQueryClient()
+    monkeypatch.setattr(report_pipeline, '_bigquery_client', lambda: client)
+    monkeypatch.setenv('STAGING_PATH', str(tmp_path))
+    spec = replace(REPORT_SPECS['sales_lines'], target='project.dataset.verkoop', keys=('OrderNummer', 'SKU'), update_columns=('Aantal',))
+    df = pd.DataFrame({'OrderNummer': ['1001'], 'Besteldatum': [date(2024, 6, 1)], 'SKU': [FIXTURE_SKU], 'Aantal': [2]})
+
+    write_bigquery(spec, df)
+
+    create, merge = [query['sql'] for query in client.executed()]
+    assert 'MERGE INTO `project.dataset.verkoop`' in merge
+    assert 'ON target.OrderNummer IS NOT DISTINCT FROM source.OrderNummer AND target.SKU IS NOT DISTINCT FROM source.SKU' in merge
+    assert 'UPDATE SET target.Aantal = source.Aantal\n' in merge
+    # A new table stores the dates of the spec as text, with '' for a missing THT date
+    assert "IFNULL(FORMAT_DATE('%Y-%m-%d', THT_Datum), '') AS THT_Datum" in create
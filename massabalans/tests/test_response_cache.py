@@ -0,0 +1,96 @@
+import pytest
+from monta_client import MontaClient
+from response_cache import ResponseCache
+from retrieve_order_info_monta import fetch_order_details
+import retrieve_order_info_monta as orders
+from stub_monta import StubMonta, make_order
+
+def fixture_orders() -> list[dict]:
+    shipped = [make_order(order_id, '2024-04-01T10:00:00') for order_id in range(1, 5)]
+    unshipped = make_order(5, '2024-04-01T10:00:00')
+    unshipped['Shipped'] = None
+    return shipped + [unshipped]
+
+def cached_client(stub: StubMonta, path: str, **cache_options) -> MontaClient:
+    return MontaClient(stub.url, 'user', 'password', rate_limit=1000, max_retries=0, cache=ResponseCache(path, **cache_options))
+
+def fetch_all(monkeypatch, client: MontaClient, order_ids: list) -> list:
+    # The order and its batches are requested at the same time, like in the order pipeline
+    monkeypatch.setattr(orders, 'monta_client', client)
+    return list(fetch_order_details(order_ids, max_workers=4))
+
+def test_second_run_of_shipped_orders_makes_no_requests(monkeypatch, tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    with StubMonta(fixture_orders()[:4]) as stub:
+        with cached_client(stub, path) as client:
+            first = fetch_all(monkeypatch, client, [1, 2, 3, 4])
+
+        stub.requests.clear()
+        with cached_client(stub, path) as client:
+            second = fetch_all(monkeypatch, client, [1, 2, 3, 4])
+            assert client.cache.hits == 8
+
+    assert sum(stub.requests.values()) == 0
+    assert second == first
+
+@pytest.mark.parametrize('first', ['order/1', 'order/1/batches'])
+def test_batches_are_stored_whichever_response_arrives_first(tmp_path, first):
+    path = str(tmp_path / 'cache.sqlite')
+    with StubMonta(fixture_orders()) as stub:
+        with cached_client(stub, path) as client:
+            for endpoint in sorted(['order/1', 'order/1/batches'], key=lambda endpoint: endpoint != first):
+                client.get(endpoint)
+        stub.requests.clear()
+        with cached_client(stub, path) as client:
+            client.get('order/1')
+            client.get('order/1/batches')
+
+    assert sum(stub.requests.values()) == 0
+
+def test_unshipped_order_is_not_cached(monkeypatch, tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    with StubMonta(fixture_orders()) as stub:
+        with cached_client(stub, path) as client:
+            fetch_all(monkeypatch, client, [5])
+            assert client.cache.total_bytes == 0 and client.cache.pending == {}
+        stub.requests.clear()
+        with cached_client(stub, path) as client:
+            fetch_all(monkeypatch, client, [5])
+
+    assert stub.requests == {'order/5': 1, 'order/5/batches': 1}
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    with StubMonta(fixture_orders()[:4]) as stub:
+        with cached_client(stub, str(tmp_path / 'cache.sqlite')) as client:
+            client.get('order/1')
+            size = client.cache.total_bytes
+            # Room for two orders, their compressed sizes differ by a few bytes
+            client.cache.max_bytes = size * 2 + size // 2
+            client.get('order/2')
+            # Order 1 is used again, so order 2 is now the least recently used
+            client.get('order/1')
+            client.get('order/3')
+
+            assert client.cache.total_bytes <= client.cache.max_bytes
+            assert client.cache.lookup('order/2') is None
+            assert client.cache.lookup('order/1') is not None and client.cache.lookup('order/3') is not None
+
+def test_stale_response_is_revalidated_with_its_etag(tmp_path):
+    with StubMonta(fixture_orders()) as stub:
+        # Every response is stale immediately
+        with cached_client(stub, str(tmp_path / 'cache.sqlite'), ttls=[(r'^order/[^/?]+$', 0)]) as client:
+            first = client.get('order/1')
+            second = client.get('order/1')
+
+            assert client.cache.revalidated == 1
+            assert stub.not_modified == 1
+            assert second.status_code == 200 and second.json() == first.json()
+
+def test_headers_of_the_caller_are_sent_next_to_the_validators(tmp_path):
+    with StubMonta(fixture_orders()) as stub:
+        with cached_client(stub, str(tmp_path / 'cache.sqlite'), ttls=[(r'^order/[^/?]+$', 0)]) as client:
+            client.get('order/1', headers={})
+            response = client.get('order/1', headers={})
+
+    assert response.status_code == 200
+    assert stub.not_modified == 1
@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from fake_gspread import FakeSpreadsheet
+from sheet_sync import frame_to_values, snapshot_file, sync_sheets
+
+# The 14 product tabs of the Massabalans spreadsheets
+SHEETS = [f'Product {index}' for index in range(14)]
+
+def frames(rows: int = 5, offset: int = 0) -> dict[str, pd.DataFrame]:
+    return {sheet: pd.DataFrame({'SKU': [f'{sheet}-{row}' for row in range(rows)], 'Aantal': [row + offset for row in range(rows)]})
+            for sheet in SHEETS}
+
+def test_new_spreadsheet_is_written_in_three_calls():
+    spreadsheet = FakeSpreadsheet()
+    sync_sheets(spreadsheet, frames())
+
+    assert spreadsheet.calls == {'fetch_sheet_metadata': 1, 'batch_update': 1, 'values_batch_update': 1}
+    assert spreadsheet.tabs['Product 3'] == frame_to_values(frames()['Product 3'])
+
+def test_existing_tabs_are_replaced_in_three_calls():
+    spreadsheet = FakeSpreadsheet(tabs={sheet: [['oud'], ['oud']] * 20 for sheet in SHEETS})
+    sync_sheets(spreadsheet, frames())
+
+    assert spreadsheet.calls == {'fetch_sheet_metadata': 1, 'values_batch_clear': 1, 'values_batch_update': 1}
+    assert all(spreadsheet.tabs[sheet] == frame_to_values(df) for sheet, df in frames().items())
+
+def test_missing_tabs_are_added_in_the_same_batch():
+    spreadsheet = FakeSpreadsheet(tabs={sheet: [['oud']] for sheet in SHEETS[:10]})
+    sync_sheets(spreadsheet, frames())
+
+    assert spreadsheet.request_count == 4
+    assert set(spreadsheet.tabs) == set(SHEETS)
+
+def test_snapshot_only_writes_changed_rows(tmp_path):
+    snapshot_path = str(tmp_path / 'sheets_snapshot.json')
+    spreadsheet = FakeSpreadsheet()
+    sync_sheets(spreadsheet, frames(), snapshot_path)
+
+    changed = frames()
+    changed['Product 2'].loc[3, 'Aantal'] = 99
+    spreadsheet.calls.clear()
+    sync_sheets(spreadsheet, changed, snapshot_path)
+
+    assert spreadsheet.calls == {'fetch_sheet_metadata': 1, 'values_batch_update': 1}
+    assert spreadsheet.tabs['Product 2'] == frame_to_values(changed['Product 2'])
+
+def test_spreadsheets_synced_at_the_same_time_keep_their_own_snapshot(tmp_path):
+    # Inbound, sales and returns share SHEETS_SNAPSHOT_PATH and may run at the same time
+    snapshot_path = str(tmp_path / 'sheets_snapshot.json')
+    spreadsheets = [FakeSpreadsheet(f'spreadsheet-{index}') for index in range(3)]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(lambda spreadsheet: sync_sheets(spreadsheet, frames(), snapshot_path), spreadsheets))
+
+    for spreadsheet in spreadsheets:
+        assert os.path.exists(snapshot_file(snapshot_path, spreadsheet.id))
+        spreadsheet.calls.clear()
+        sync_sheets(spreadsheet, frames(), snapshot_path)
+        # Nothing changed, so nothing is written
+        assert spreadsheet.calls == {'fetch_sheet_metadata': 1}
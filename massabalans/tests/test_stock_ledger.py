@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+import pandas as pd
+from fake_bigquery import FakeBigQueryClient
+from stock_ledger import build_ledger, contiguous_runs, load_daily_snapshots
+
+TABLE = 'project.dataset.stock'
+
+def stock_table(days: list[date]) -> pd.DataFrame:
+    return pd.DataFrame({
+        'Datum': [day for day in days for _ in range(2)],
+        'Product': ['A', 'B'] * len(days),
+        'Batch': ['1', '2'] * len(days),
+        'Aantal': [10, 20] * len(days),
+    })
+
+def stock_client(table: pd.DataFrame) -> FakeBigQueryClient:
+    # Answers the range query from an in-memory stock table
+    def results(sql, params):
+        return table[(table['Datum'] >= params['first_day']) & (table['Datum'] <= params['last_day'])].reset_index(drop=True)
+    return FakeBigQueryClient(results)
+
+def test_contiguous_runs():
+    days = [date(2024, 4, day) for day in (1, 2, 3, 5, 8, 9)]
+    assert contiguous_runs(days) == [(date(2024, 4, 1), date(2024, 4, 3)), (date(2024, 4, 5), date(2024, 4, 5)),
+                                     (date(2024, 4, 8), date(2024, 4, 9))]
+
+def test_only_gaps_between_cached_days_are_queried(tmp_path):
+    days = list(pd.date_range('2024-04-01', '2024-04-10').date)
+    client = stock_client(stock_table(days))
+    load_daily_snapshots(TABLE, days[0], days[2], str(tmp_path), client)
+    load_daily_snapshots(TABLE, days[5], days[6], str(tmp_path), client)
+    client.queries.clear()
+
+    snapshots = load_daily_snapshots(TABLE, days[0], days[9], str(tmp_path), client)
+
+    # 4-5 and 8-10 are missing, the cached days 1-3 and 6-7 are not scanned again
+    assert [(query['params']['first_day'], query['params']['last_day']) for query in client.executed()] == [
+        (days[3], days[4]), (days[7], days[9])]
+    assert len(snapshots) == 20
+
+def test_empty_days_are_not_cached(tmp_path):
+    loaded = list(pd.date_range('2024-04-01', '2024-04-03').date)
+    table = stock_table(loaded)
+    client = stock_client(table)
+    snapshots = load_daily_snapshots(TABLE, date(2024, 4, 1), date(2024, 4, 5), str(tmp_path), client)
+    assert set(snapshots['Datum']) == set(loaded)
+
+    # The table is loaded late: the 4th and 5th arrive after the first run and are picked up by the next one
+    late = stock_table([date(2024, 4, 4), date(2024, 4, 5)])
+    client.results = lambda sql, params: pd.concat([table, late]).query('@params["first_day"] <= Datum <= @params["last_day"]')
+    client.queries.clear()
+    snapshots = load_daily_snapshots(TABLE, date(2024, 4, 1), date(2024, 4, 5), str(tmp_path), client)
+
+    assert [(query['params']['first_day'], query['params']['last_day']) for query in client.executed()] == [
+        (date(2024, 4, 4), date(2024, 4, 5))]
+    assert len(snapshots) == 10
+
+def test_today_is_never_cached(tmp_path):
+    today = date.today()
+    client = stock_client(stock_table([today - timedelta(days=1), today]))
+    load_daily_snapshots(TABLE, today - timedelta(days=1), today, str(tmp_path), client)
+    client.queries.clear()
+    load_daily_snapshots(TABLE, today - timedelta(days=1), today, str(tmp_path), client)
+
+    assert [(query['params']['first_day'], query['params']['last_day']) for query in client.executed()] == [(today, today)]
+
+def test_ledger_from_a_mid_week_start_keeps_lines_without_batch():
+    # Wednesday 3 April up to Tuesday 16 April: the first and last week are cut off at the requested range
+    days = list(pd.date_range('2024-04-03', '2024-04-16').date)
+    snapshots = pd.DataFrame({
+        'Datum': [day for day in days for _ in range(2)],
+        'Product': ['A', 'B'] * len(days),
+        'Batch': ['1', None] * len(days),
+        'Aantal': [quantity for day in days for quantity in (100 - day.day, 50 + day.day)],
+    })
+
+    ledger = build_ledger(snapshots, days[0], days[-1])
+
+    assert ledger.to_dict('records') == [
+        {'Periode': '2024-04-01/2024-04-07', 'Product': 'A', 'Batch': '1', 'Begin': 97, 'Mutatie': -4, 'Eind': 93},
+        {'Periode': '2024-04-01/2024-04-07', 'Product': 'B', 'Batch': '', 'Begin': 53, 'Mutatie': 4, 'Eind': 57},
+        {'Periode': '2024-04-08/2024-04-14', 'Product': 'A', 'Batch': '1', 'Begin': 92, 'Mutatie': -6, 'Eind': 86},
+        {'Periode': '2024-04-08/2024-04-14', 'Product': 'B', 'Batch': '', 'Begin': 58, 'Mutatie': 6, 'Eind': 64},
+        {'Periode': '2024-04-15/2024-04-21', 'Product': 'A', 'Batch': '1', 'Begin': 85, 'Mutatie': -1, 'Eind': 84},
+        {'Periode': '2024-04-15/2024-04-21', 'Product': 'B', 'Batch': '', 'Begin': 65, 'Mutatie': 1, 'Eind': 66},
+    ]
@@ -0,0 +1,31 @@
+import re
+import sqlite3
+from datetime import date
+import pandas as pd
+from stock_overview import KEYS, compute_mutations, stock_mutation_query
+from synthetic_stock import make_stock_snapshots
+
+TABLE = 'project.dataset.stock'
+START = date(2024, 4, 1)
+END = date(2024, 4, 7)
+
+def run_in_sqlite(starting_stock: pd.DataFrame, end_stock: pd.DataFrame) -> pd.DataFrame:
+    # SQLite runs the FULL OUTER JOIN as is, only the BigQuery date functions are rewritten
+    table = pd.concat([starting_stock.assign(Timestamp=f'{START} 06:00:00'), end_stock.assign(Timestamp=f'{END} 06:00:00')])
+    sql = re.sub(r'DATE_ADD\((@\w+), INTERVAL 1 DAY\)', r"DATE(\1, '+1 day')", stock_mutation_query(TABLE))
+    with sqlite3.connect(':memory:') as connection:
+        connection.create_function('TIMESTAMP', 1, lambda value: value)
+        table.to_sql(TABLE, connection, index=False)
+        return pd.read_sql_query(sql, connection, params={'start_date': str(START), 'end_date': str(END)})
+
+def test_query_and_local_merge_agree_on_lines_without_batch():
+    starting_stock, end_stock = make_stock_snapshots(2000, without_batch=0.1)
+    # A product without batch in both snapshots is one line with a mutation, not two lines with 0 on one side
+    starting_stock.loc[len(starting_stock)] = ['P99999', None, 5]
+    end_stock.loc[len(end_stock)] = ['P99999', None, 8]
+
+    local = compute_mutations(starting_stock, end_stock).sort_values(KEYS, ignore_index=True)
+    query = run_in_sqlite(starting_stock, end_stock).sort_values(KEYS, ignore_index=True)
+
+    pd.testing.assert_frame_equal(local, query[local.columns], check_dtype=False)
+    assert local[(local['Product'] == 'P99999')][['Batch', 'Aantal_start', 'Aantal_end', 'Aantal']].values.tolist() == [['', 5, 8, 3]]
@@ -0,0 +1,11 @@
+import os
+import pandas as pd
+import pytest
+from xlsx_reader import read_xlsx_report
+
+OUD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'oud')
+
+@pytest.mark.parametrize('name', ['cleaned_inbound_report_2024-06-17.xlsx', 'cleaned_sales_report_2024-06-17.xlsx'])
+def test_same_frame_as_read_excel(name):
+    path = os.path.join(OUD_DIR, name)
+    pd.testing.assert_frame_equal(read_xlsx_report(path), pd.read_excel(path, engine='openpyxl'))